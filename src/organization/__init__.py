@@ -1,11 +1,13 @@
 """组织架构模块"""
 
-from .models import ORGANIZATION, Group, Role, Person
+from .models import ORGANIZATION, ORGANIZATION_GROUPS, ORGANIZATION_OBJS, Group, Role, Person
 from .services import OrganizationService
 from .router import router
 
 __all__ = [
     'ORGANIZATION',
+    'ORGANIZATION_GROUPS',
+    'ORGANIZATION_OBJS',
     'Group',
     'Role', 
     'Person',
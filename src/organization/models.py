@@ -1,17 +1,18 @@
 """组织模型定义"""
 
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Role:
     """角色模型"""
     name: str
     description: str = ""
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Person:
     """人员模型"""
     name: str
@@ -21,7 +22,7 @@ class Person:
     skills: List[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Group:
     """组织组模型"""
     key: str
@@ -33,7 +34,7 @@ class Group:
 
 
 # 组织结构定义
-ORGANIZATION: Dict[str, Dict] = {
+_ORGANIZATION_DATA: Dict[str, Dict] = {
     "strategic_group": {
         "name": "战略科学家组",
         "leader": {"name": "诸葛亮", "role": "组长"},
@@ -49,7 +50,20 @@ ORGANIZATION: Dict[str, Dict] = {
 }
 
 
-def get_group_from_dict(data: Dict) -> Group:
+def _freeze(value: Any) -> Any:
+    """递归转换为只读结构（dict -> MappingProxyType，list -> tuple）"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+# 只读组织结构，任何修改都会抛出TypeError
+ORGANIZATION: Mapping[str, Mapping] = _freeze(_ORGANIZATION_DATA)
+
+
+def get_group_from_dict(data: Mapping) -> Group:
     """从字典创建Group对象"""
     leader_data = data.get("leader", {})
     leader = Person(
@@ -57,9 +71,17 @@ def get_group_from_dict(data: Dict) -> Group:
         role=leader_data.get("role", "")
     )
     return Group(
-        key="",
+        key=data.get("key", ""),
         name=data.get("name", ""),
         leader=leader,
         members=data.get("members", 0),
         core_function=data.get("core_function", "")
     )
+
+
+# 组织结构对象（导入时一次性构建，读路径直接引用，请求时零分配）
+ORGANIZATION_GROUPS: Mapping[str, Group] = MappingProxyType({
+    key: get_group_from_dict({**data, "key": key})
+    for key, data in ORGANIZATION.items()
+})
+ORGANIZATION_OBJS: Tuple[Group, ...] = tuple(ORGANIZATION_GROUPS.values())
@@ -1,53 +1,106 @@
 """API路由"""
 
-from typing import Dict, List
-from fastapi import APIRouter
-from .services import OrganizationService
-
-router = APIRouter(prefix="/organization", tags=["组织架构"])
-service = OrganizationService()
-
-
-@router.get("")
-def get_organization() -> Dict[str, Dict]:
+from typing import Any
+
+import orjson
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import ORJSONResponse
+from .services import (
+    get_all_groups_bytes,
+    get_core_functions_bytes,
+    get_etag,
+    get_group_payload,
+    get_leaders_bytes,
+    get_organization_bytes,
+    get_stats_bytes,
+)
+from .services import search_person as find_persons
+
+
+class ORJSONDataclassResponse(ORJSONResponse):
+    """orjson响应，直接序列化dataclass（无需asdict转换），只读映射按dict处理"""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=dict,
+            option=orjson.OPT_SERIALIZE_DATACLASS | orjson.OPT_NON_STR_KEYS
+        )
+
+
+# 端点直接调用services模块级函数读取预序列化字节，无需服务实例
+# 端点均为纯内存读取，使用async def免去线程池切换
+# 端点不声明响应模型（response_model=None），直接返回Response以跳过校验与jsonable_encoder
+router = APIRouter(
+    prefix="/organization",
+    tags=["组织架构"],
+    default_response_class=ORJSONDataclassResponse
+)
+
+
+# 组织数据按部署静态，允许客户端短时缓存
+CACHE_CONTROL = "public, max-age=60"
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """判断If-None-Match是否命中ETag（支持列表、弱校验前缀及*）"""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _json_response(request: Request, body: bytes, etag: str) -> Response:
+    """包装预序列化JSON；命中If-None-Match时返回304
+
+    Response每次新建（中间件可能修改其headers），body字节复用
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@router.get("", response_model=None)
+async def get_organization(request: Request):
     """获取完整组织架构"""
-    return service.get_organization()
+    return _json_response(request, get_organization_bytes(), get_etag("organization"))
 
 
-@router.get("/groups")
-def get_all_groups() -> List[Dict]:
+@router.get("/groups", response_model=None)
+async def get_all_groups(request: Request):
     """获取所有组列表"""
-    return service.get_all_groups()
+    return _json_response(request, get_all_groups_bytes(), get_etag("groups"))
 
 
-@router.get("/groups/{group_key}")
-def get_group(group_key: str) -> Dict:
+@router.get("/groups/{group_key}", response_model=None)
+async def get_group(group_key: str, request: Request):
     """获取指定组信息"""
-    return service.get_group(group_key)
+    body, etag = get_group_payload(group_key)
+    return _json_response(request, body, etag)
 
 
-@router.get("/leaders")
-def get_leaders() -> List[Dict]:
+@router.get("/leaders", response_model=None)
+async def get_leaders(request: Request):
     """获取所有组长"""
-    return service.get_leaders()
+    return _json_response(request, get_leaders_bytes(), get_etag("leaders"))
 
 
-@router.get("/stats")
-def get_stats() -> Dict:
+@router.get("/stats", response_model=None)
+async def get_stats(request: Request):
     """获取组织统计信息"""
-    return {
-        "groups_count": service.get_groups_count(),
-        "total_members": service.get_total_members()
-    }
+    return _json_response(request, get_stats_bytes(), get_etag("stats"))
 
 
-@router.get("/search/person")
-def search_person(name: str) -> List[Dict]:
+@router.get("/search/person", response_model=None)
+async def search_person(name: str):
     """搜索人员"""
-    return service.search_person(name)
+    return ORJSONDataclassResponse(find_persons(name))
 
 
-@router.get("/functions")
-def get_core_functions() -> Dict[str, str]:
+@router.get("/functions", response_model=None)
+async def get_core_functions(request: Request):
     """获取各组核心职能"""
-    return service.get_core_functions()
+    return _json_response(request, get_core_functions_bytes(), get_etag("functions"))
@@ -1,61 +1,211 @@
-"""组织服务层"""
+"""组织服务层
 
-from typing import Dict, List, Optional
-from .models import ORGANIZATION, Group, Person, get_group_from_dict
+组织数据为只读的静态配置，查询结构与JSON字节均在模块导入时一次性构建。
+路由层直接调用模块级函数读取预序列化字节；OrganizationService保留为字典形式的查询接口。
+"""
+
+import hashlib
+from bisect import bisect_right
+from functools import lru_cache
+from typing import ClassVar, Dict, List, Mapping, Optional, Tuple
+
+import orjson
+
+from .models import ORGANIZATION, ORGANIZATION_OBJS, Group, Person, _freeze, get_group_from_dict
+
+
+def compute_etag(body: bytes) -> str:
+    """根据响应内容计算强ETag"""
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+def _build_leaders() -> Tuple[Mapping, ...]:
+    """构建组长列表（只读）"""
+    return tuple(
+        _freeze({"name": group.leader.name, "role": group.leader.role, "group": group.name})
+        for group in ORGANIZATION_OBJS
+    )
+
+
+def _build_core_functions() -> Mapping[str, str]:
+    """构建各组核心职能映射（只读）"""
+    return _freeze({group.name: group.core_function for group in ORGANIZATION_OBJS})
+
+
+def _build_person_index() -> Tuple[Tuple[str, ...], Tuple[Mapping, ...]]:
+    """构建人员姓名索引（组长及组成员，人员记录只读）"""
+    names: List[str] = []
+    records: List[Mapping] = []
+    for group in ORGANIZATION_OBJS:
+        for person in (group.leader, *group.members_detail):
+            names.append(person.name.lower())
+            records.append(_freeze({
+                "name": person.name,
+                "role": person.role,
+                "group": group.name,
+                "group_key": group.key
+            }))
+    return tuple(names), tuple(records)
+
+
+def _build_name_offsets(names: Tuple[str, ...]) -> Tuple[int, ...]:
+    """计算每个姓名在语料中的起始位置"""
+    offsets = []
+    position = 0
+    for person_name in names:
+        offsets.append(position)
+        position += len(person_name) + 1
+    return tuple(offsets)
+
+
+# 查询结构（元组与只读映射：不可变、可共享，orjson序列化与列表、字典一致）
+_ALL_GROUPS: Tuple[Mapping, ...] = tuple(ORGANIZATION.values())
+_LEADERS = _build_leaders()
+_CORE_FUNCTIONS = _build_core_functions()
+_GROUPS_COUNT = len(ORGANIZATION)
+_TOTAL_MEMBERS = sum(group.members for group in ORGANIZATION_OBJS)
+
+# 人员姓名索引（SoA布局：小写姓名与人员记录两个平行元组）
+_PERSON_NAMES, _PERSON_RECORDS = _build_person_index()
+# 姓名拼接为单一语料，子串搜索交由str.find在C层完成
+_NAME_CORPUS = "\n".join(_PERSON_NAMES)
+_NAME_OFFSETS = _build_name_offsets(_PERSON_NAMES)
+
+# 预序列化JSON
+_ORG_BYTES = orjson.dumps(ORGANIZATION, default=dict)
+_GROUPS_BYTES = orjson.dumps(_ALL_GROUPS, default=dict)
+_LEADERS_BYTES = orjson.dumps(_LEADERS, default=dict)
+_FUNCTIONS_BYTES = orjson.dumps(_CORE_FUNCTIONS, default=dict)
+_STATS_BYTES = orjson.dumps({
+    "groups_count": _GROUPS_COUNT,
+    "total_members": _TOTAL_MEMBERS
+})
+_GROUP_BYTES: Dict[str, bytes] = {
+    key: orjson.dumps(data, default=dict) for key, data in ORGANIZATION.items()
+}
+# 未知组的响应内容
+_NULL_JSON = b"null"
+
+# 各静态载荷的ETag（内容哈希），供条件请求返回304
+_ETAGS: Dict[str, str] = {
+    "organization": compute_etag(_ORG_BYTES),
+    "groups": compute_etag(_GROUPS_BYTES),
+    "leaders": compute_etag(_LEADERS_BYTES),
+    "functions": compute_etag(_FUNCTIONS_BYTES),
+    "stats": compute_etag(_STATS_BYTES)
+}
+_NULL_ETAG = compute_etag(_NULL_JSON)
+
+# 单组响应内容与ETag合并存放，每次请求只需一次字典查找
+_GROUP_PAYLOADS: Dict[str, Tuple[bytes, str]] = {
+    key: (body, compute_etag(body)) for key, body in _GROUP_BYTES.items()
+}
+_NULL_PAYLOAD = (_NULL_JSON, _NULL_ETAG)
+
+
+def get_organization_bytes() -> bytes:
+    """获取完整组织架构（预序列化JSON）"""
+    return _ORG_BYTES
+
+
+def get_all_groups_bytes() -> bytes:
+    """获取所有组列表（预序列化JSON）"""
+    return _GROUPS_BYTES
+
+
+def get_group_payload(group_key: str) -> Tuple[bytes, str]:
+    """获取指定组信息的预序列化JSON及ETag（未知组为null）"""
+    return _GROUP_PAYLOADS.get(group_key, _NULL_PAYLOAD)
+
+
+def get_leaders_bytes() -> bytes:
+    """获取所有组长信息（预序列化JSON）"""
+    return _LEADERS_BYTES
+
+
+def get_core_functions_bytes() -> bytes:
+    """获取各组核心职能（预序列化JSON）"""
+    return _FUNCTIONS_BYTES
+
+
+def get_stats_bytes() -> bytes:
+    """获取组织统计信息（预序列化JSON）"""
+    return _STATS_BYTES
+
+
+def get_etag(payload: str) -> str:
+    """获取静态载荷的ETag（organization/groups/leaders/functions/stats）"""
+    return _ETAGS[payload]
+
+
+@lru_cache(maxsize=512)
+def _search_person(name: str) -> Tuple[Mapping, ...]:
+    """在姓名语料中搜索（name需已转为小写）"""
+    if not name:
+        return _PERSON_RECORDS
+    if "\n" in name:
+        return ()
+
+    results = []
+    position = _NAME_CORPUS.find(name)
+    while position != -1:
+        index = bisect_right(_NAME_OFFSETS, position) - 1
+        results.append(_PERSON_RECORDS[index])
+        # 跳到下一个姓名起点，避免同一姓名重复命中
+        if index + 1 >= len(_NAME_OFFSETS):
+            break
+        position = _NAME_CORPUS.find(name, _NAME_OFFSETS[index + 1])
+    return tuple(results)
+
+
+def search_person(name: str) -> Tuple[Mapping, ...]:
+    """搜索人员"""
+    return _search_person(name.lower())
+
+
+def clear_search_cache():
+    """清空人员搜索缓存（组织数据变更后调用）"""
+    _search_person.cache_clear()
 
 
 class OrganizationService:
     """组织服务类"""
     
-    def __init__(self):
-        self.org_data = ORGANIZATION.copy()
+    # 组织数据只读，所有实例共享同一份引用
+    org_data: ClassVar[Mapping[str, Mapping]] = ORGANIZATION
     
-    def get_organization(self) -> Dict[str, Dict]:
+    def get_organization(self) -> Mapping[str, Mapping]:
         """获取完整组织架构"""
         return self.org_data
     
-    def get_group(self, group_key: str) -> Optional[Dict]:
+    def get_group(self, group_key: str) -> Optional[Mapping]:
         """获取指定组信息"""
         return self.org_data.get(group_key)
     
-    def get_all_groups(self) -> List[Dict]:
+    def get_all_groups(self) -> Tuple[Mapping, ...]:
         """获取所有组列表"""
-        return list(self.org_data.values())
+        return _ALL_GROUPS
     
-    def get_leaders(self) -> List[Dict]:
+    def get_leaders(self) -> Tuple[Mapping, ...]:
         """获取所有组长信息"""
-        leaders = []
-        for group_key, group_data in self.org_data.items():
-            leader_info = group_data.get("leader", {})
-            leader_info["group"] = group_data.get("name")
-            leaders.append(leader_info)
-        return leaders
+        return _LEADERS
     
     def get_groups_count(self) -> int:
         """获取组数量"""
-        return len(self.org_data)
+        return _GROUPS_COUNT
     
     def get_total_members(self) -> int:
         """获取总人数"""
-        return sum(group.get("members", 0) for group in self.org_data.values())
+        return _TOTAL_MEMBERS
     
-    def search_person(self, name: str) -> List[Dict]:
+    def search_person(self, name: str) -> Tuple[Mapping, ...]:
         """搜索人员"""
-        results = []
-        for group_key, group_data in self.org_data.items():
-            leader = group_data.get("leader", {})
-            if name in leader.get("name", ""):
-                results.append({
-                    "name": leader.get("name"),
-                    "role": leader.get("role"),
-                    "group": group_data.get("name"),
-                    "group_key": group_key
-                })
-        return results
-    
-    def get_core_functions(self) -> Dict[str, str]:
+        return search_person(name)
+    
+    def clear_search_cache(self):
+        """清空人员搜索缓存（组织数据变更后调用）"""
+        clear_search_cache()
+    
+    def get_core_functions(self) -> Mapping[str, str]:
         """获取各组核心职能"""
-        functions = {}
-        for group_key, group_data in self.org_data.items():
-            functions[group_data.get("name")] = group_data.get("core_function", "")
-        return functions
+        return _CORE_FUNCTIONS
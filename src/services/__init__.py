@@ -23,8 +23,11 @@ from .sop_engine import (
     Agent,
     SOPStep,
     SOPResult,
+    StepExecution,
     AgentRole,
     SOPTemplate,
+    CompiledPlan,
+    build_prompt,
     create_default_sop_engine,
     create_quick_sop,
     create_detailed_sop,
@@ -38,8 +41,11 @@ __all__ = [
     "Agent",
     "SOPStep",
     "SOPResult",
+    "StepExecution",
     "AgentRole",
     "SOPTemplate",
+    "CompiledPlan",
+    "build_prompt",
     "create_default_sop_engine",
     "create_quick_sop",
     "create_detailed_sop",
@@ -10,18 +10,25 @@
 """
 
 import asyncio
+import atexit
+import copy
 import hashlib
+import heapq
+import importlib.util
 import json
 import os
 import re
 import shutil
 import sqlite3
+import threading
 import uuid
-from dataclasses import dataclass, field, asdict
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict, replace
 from datetime import datetime, timedelta
+from functools import lru_cache, wraps
+from operator import itemgetter
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
-from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import math
 
 # 尝试导入向量库
@@ -32,6 +39,16 @@ except ImportError:
     VECTOR_AVAILABLE = False
     np = None
 
+try:
+    import faiss
+    FAISS_AVAILABLE = VECTOR_AVAILABLE
+except ImportError:
+    FAISS_AVAILABLE = False
+    faiss = None
+
+# numba导入与JIT编译开销较大，仅检查是否安装，首次int8搜索时再导入编译
+NUMBA_AVAILABLE = VECTOR_AVAILABLE and importlib.util.find_spec("numba") is not None
+
 try:
     from sklearn.feature_extraction.text import TfidfVectorizer
     from sklearn.metrics.pairwise import cosine_similarity
@@ -39,6 +56,113 @@ try:
 except ImportError:
     TFIDF_AVAILABLE = False
 
+try:
+    from fastembed import TextEmbedding
+    FASTEMBED_AVAILABLE = True
+except ImportError:
+    FASTEMBED_AVAILABLE = False
+
+# 未指定embedder时使用的fastembed模型
+DEFAULT_EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
+
+def _json_dumps(obj: Any, indent: bool = False) -> str:
+    """序列化为JSON字符串（优先orjson，否则回退标准库json）"""
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None)
+
+
+def _json_loads(data: Any) -> Any:
+    """解析JSON字符串或字节"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# DELETE ... RETURNING需要SQLite 3.35+
+_SQLITE_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# 关键词分词：英文单词或连续汉字
+_TOKEN_RE = re.compile(r'[a-zA-Z\u4e00-\u9fa5]+')
+# 停用词
+_STOPWORDS = frozenset({
+    '的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一',
+    'the', 'a', 'an', 'is', 'are', 'was', 'were', 'to', 'of', 'in', 'for',
+    'and', 'or', 'but', 'on', 'at', 'by', 'with', 'this', 'that'
+})
+
+
+@lru_cache(maxsize=4096)
+def _tokenize(text: str) -> Tuple[str, ...]:
+    """分词并去除停用词与单字符词（结果去重，按文本缓存）"""
+    return tuple({
+        w for w in _TOKEN_RE.findall(text.lower())
+        if len(w) > 1 and w not in _STOPWORDS
+    })
+
+
+_int8_scores: Optional[Callable] = None
+
+
+def _get_int8_kernel() -> Optional[Callable]:
+    """首次调用时导入numba并编译int8内积内核，导入或编译失败时返回None（回退numpy分块计算）"""
+    global _int8_scores, NUMBA_AVAILABLE
+    if _int8_scores is None and NUMBA_AVAILABLE:
+        try:
+            import numba
+            
+            @numba.njit("void(int8[:, ::1], float32[::1], float32[::1])",
+                        parallel=True, fastmath=True)
+            def kernel(matrix, query, out):
+                """int8矩阵逐行与查询求内积：逐元素转换，不生成float32副本"""
+                for i in numba.prange(matrix.shape[0]):
+                    acc = numba.float32(0.0)
+                    for j in range(matrix.shape[1]):
+                        acc += numba.float32(matrix[i, j]) * query[j]
+                    out[i] = acc
+            
+            _int8_scores = kernel
+        except Exception as e:
+            print(f"Error compiling numba kernel, using numpy fallback: {e}")
+            NUMBA_AVAILABLE = False
+    return _int8_scores
+
+
+def _replace_atomically(path: str, write: Callable[[str], None]):
+    """写入同目录临时文件、fsync后原子替换目标文件，崩溃时不会留下半个文件"""
+    tmp_path = path + ".tmp"
+    try:
+        write(tmp_path)
+        fd = os.open(tmp_path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _synchronized(method):
+    """以实例的_lock串行化方法调用（检索在线程池中执行，写入在事件循环中执行）"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 @dataclass
 class Memory:
@@ -63,88 +187,491 @@ class Memory:
 
 
 class VectorStore:
-    """向量存储管理器"""
+    """向量存储管理器
+    
+    所有向量在写入时L2归一化（不变量：只存单位向量），
+    查询向量在search入口归一化一次，相似度即为内积。
     
-    def __init__(self, storage_path: str):
+    可用numpy时，向量量化后（float16/int8）保存在连续矩阵中，持久化为vectors.npz，
+    搜索时分块反量化再做矩阵乘法；否则以列表形式保存在self.vectors并持久化为vectors.json。
+    安装FAISS时另建HNSW近似最近邻索引（内积度量）加速搜索。
+    
+    增删操作只追加写入vectors.log（JSONL），每LOG_SYNC_EVERY条fsync一次；
+    快照与索引文件仅在compact()/close()（含进程退出）时整体重写，加载时回放日志。
+    """
+    
+    HNSW_M = 16  # HNSW每个节点的邻居数
+    TOMBSTONE_REBUILD_RATIO = 0.25  # 墓碑超过索引向量总数的该比例时重建索引
+    MAX_OVERFETCH = 256  # 搜索时为抵消墓碑最多多取的结果数，仍不足时回退精确搜索
+    SCORE_BLOCK = 4096  # 分块反量化的行数，使每块留在CPU缓存中
+    INT8_SCALE = 127.0  # 单位向量各分量在[-1, 1]，对称量化无需逐维scale/zero-point
+    DTYPES = {"float32": "float32", "float16": "float16", "int8": "int8"}
+    LOG_SYNC_EVERY = 100  # 日志每N次写入fsync一次
+    COMPACT_AFTER = 10000  # 日志累计N条后由maybe_compact()压缩为快照
+    
+    def __init__(self, storage_path: str, quantization: str = "float16"):
+        """
+        Args:
+            storage_path: 存储路径
+            quantization: 向量量化精度 ('float32', 'float16', 'int8')
+        """
+        if quantization not in self.DTYPES:
+            raise ValueError(f"不支持的量化精度: {quantization}")
         self.storage_path = storage_path
         self.vectors_file = os.path.join(storage_path, "vectors.json")
+        self.matrix_file = os.path.join(storage_path, "vectors.npz")
+        self.index_file = os.path.join(storage_path, "vectors.faiss")
+        self.log_file = os.path.join(storage_path, "vectors.log")
+        self.quantization = quantization
+        # 无numpy时的向量存储
         self.vectors: Dict[str, List[float]] = {}
+        # FAISS索引及 int64 -> memory_id 映射；HNSW不支持删除，已删除ID记为墓碑在搜索时过滤
+        self._index = None
+        self._faiss_ids: Dict[int, str] = {}
+        self._tombstones: set = set()
+        # 量化向量矩阵：前len(_ids)行有效，_ids/_row为行号与memory_id的双向映射
+        self._matrix = None
+        self._ids: List[str] = []
+        self._row: Dict[str, int] = {}
+        # 搜索可能在线程池中与写入并发
+        self._lock = threading.RLock()
+        # 自上次快照以来的日志条数
+        self._log_entries = 0
         self._load_vectors()
+        self._replay_log()
+        if FAISS_AVAILABLE:
+            self._load_index()
+        self._log = open(self.log_file, 'a', encoding='utf-8')
+        self._unsynced = 0
+        atexit.register(self.close)
     
     def _load_vectors(self):
-        """加载向量数据"""
+        """加载向量数据（优先vectors.npz，兼容旧版vectors.json）"""
+        if VECTOR_AVAILABLE and os.path.exists(self.matrix_file):
+            try:
+                with np.load(self.matrix_file) as data:
+                    ids = data["ids"].tolist()
+                    matrix = data["vectors"]
+                    stored_quantization = str(data["quantization"])
+                if ids:
+                    if stored_quantization != self.quantization:
+                        matrix = self._quantize(self._dequantize(matrix, stored_quantization))
+                    self._matrix = matrix.copy()
+                    self._ids = ids
+                    self._row = {mid: i for i, mid in enumerate(ids)}
+                return
+            except Exception:
+                self._matrix = None
+                self._ids = []
+                self._row = {}
+        
         if os.path.exists(self.vectors_file):
             try:
                 with open(self.vectors_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.vectors = {k: v for k, v in data.items()}
+                    data = _json_loads(f.read())
+                    vectors = {k: self._normalize(v) for k, v in data.items()}
             except Exception:
-                self.vectors = {}
+                vectors = {}
+            if VECTOR_AVAILABLE:
+                for mid, embedding in vectors.items():
+                    self._matrix_add(mid, embedding)
+            else:
+                self.vectors = vectors
+    
+    def _replay_log(self):
+        """回放快照之后的增量日志（忽略崩溃时写了一半的行）"""
+        if not os.path.exists(self.log_file):
+            return
+        with open(self.log_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                self._log_entries += 1
+                try:
+                    entry = _json_loads(line)
+                except ValueError:
+                    continue
+                if entry.get("op") == "add":
+                    self._store_add(entry["id"], entry["v"])
+                elif entry.get("op") == "delete":
+                    self._store_delete(entry["id"])
+    
+    def _append_log(self, entry: Dict[str, Any]):
+        """追加一条日志记录"""
+        if self._log is None:
+            return
+        self._log.write(_json_dumps(entry) + "\n")
+        self._log_entries += 1
+        self._unsynced += 1
+        if self._unsynced >= self.LOG_SYNC_EVERY:
+            self.flush()
+    
+    @_synchronized
+    def flush(self):
+        """将日志落盘"""
+        if self._log is None or not self._unsynced:
+            return
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._unsynced = 0
+    
+    @_synchronized
+    def compact(self):
+        """重写快照与索引文件并清空日志（快照写入失败时保留日志）"""
+        if not self.save_vectors():
+            return
+        if self._log is not None:
+            self._log.flush()
+            self._log.truncate(0)
+            self._log.seek(0)
+            self._unsynced = 0
+        self._log_entries = 0
+    
+    @_synchronized
+    def maybe_compact(self):
+        """日志累计超过COMPACT_AFTER条时压缩"""
+        if self._log_entries >= self.COMPACT_AFTER:
+            self.compact()
     
-    def save_vectors(self):
-        """保存向量数据"""
+    @_synchronized
+    def close(self):
+        """压缩并关闭日志（进程退出时自动调用）"""
+        if self._log is None:
+            return
+        self.compact()
+        self._log.close()
+        self._log = None
+        atexit.unregister(self.close)
+    
+    def save_vectors(self) -> bool:
+        """保存向量快照（原子替换），返回是否成功"""
         try:
-            with open(self.vectors_file, 'w', encoding='utf-8') as f:
-                json.dump(self.vectors, f, ensure_ascii=False)
+            if VECTOR_AVAILABLE:
+                size = len(self._ids)
+                matrix = self._matrix[:size] if self._matrix is not None else np.zeros((0, 0))
+                
+                def write(path: str):
+                    with open(path, 'wb') as f:
+                        np.savez(
+                            f,
+                            ids=np.array(self._ids, dtype=str),
+                            vectors=matrix,
+                            quantization=np.array(self.quantization)
+                        )
+                
+                _replace_atomically(self.matrix_file, write)
+                # 已迁移到vectors.npz，移除旧格式文件
+                if os.path.exists(self.vectors_file):
+                    os.remove(self.vectors_file)
+            else:
+                data = _json_dumps(self.vectors)
+                
+                def write(path: str):
+                    with open(path, 'w', encoding='utf-8') as f:
+                        f.write(data)
+                
+                _replace_atomically(self.vectors_file, write)
         except Exception as e:
             print(f"Error saving vectors: {e}")
+            return False
+        self._save_index()
+        return True
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> List[float]:
+        """L2归一化（零向量原样返回）"""
+        norm = math.sqrt(sum(x * x for x in embedding))
+        if norm == 0:
+            return list(embedding)
+        return [x / norm for x in embedding]
+    
+    def _quantize(self, vectors: "np.ndarray") -> "np.ndarray":
+        """float32单位向量 -> 存储精度"""
+        if self.quantization == "int8":
+            return np.clip(np.rint(vectors * self.INT8_SCALE), -127, 127).astype(np.int8)
+        return vectors.astype(self.DTYPES[self.quantization])
+    
+    def _dequantize(self, vectors: "np.ndarray", quantization: Optional[str] = None) -> "np.ndarray":
+        """存储精度 -> float32"""
+        result = vectors.astype(np.float32)
+        if (quantization or self.quantization) == "int8":
+            result *= 1.0 / self.INT8_SCALE
+        return result
+    
+    @property
+    def dim(self) -> Optional[int]:
+        """向量维度（尚无向量时为None）"""
+        if VECTOR_AVAILABLE:
+            return self._matrix.shape[1] if self._matrix is not None else None
+        return len(next(iter(self.vectors.values()))) if self.vectors else None
+    
+    @_synchronized
+    def reset(self):
+        """清空全部向量及其持久化文件（如嵌入模型维度变化）"""
+        self.vectors = {}
+        self._matrix = None
+        self._ids = []
+        self._row = {}
+        self._index = None
+        self._faiss_ids = {}
+        self._tombstones = set()
+        for path in (self.vectors_file, self.matrix_file, self.index_file):
+            if os.path.exists(path):
+                os.remove(path)
+        if self._log is not None:
+            self._log.flush()
+            self._log.truncate(0)
+            self._unsynced = 0
+        self._log_entries = 0
+    
+    def ids(self) -> List[str]:
+        """所有已存储向量的memory_id"""
+        return list(self._ids) if VECTOR_AVAILABLE else list(self.vectors)
+    
+    @staticmethod
+    def _to_faiss_id(memory_id: str) -> int:
+        """将memory_id稳定映射为非负int64（FAISS保留-1表示无结果）"""
+        digest = hashlib.blake2b(memory_id.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') >> 1
+    
+    def _new_index(self, dim: int):
+        """创建HNSW索引"""
+        return faiss.IndexIDMap2(
+            faiss.IndexHNSWFlat(dim, self.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        )
+    
+    def _index_add(self, memory_id: str, embedding: List[float]):
+        """向FAISS索引添加单个向量"""
+        vec = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        if self._index is None:
+            self._index = self._new_index(vec.shape[1])
+        elif vec.shape[1] != self._index.d:
+            return
+        faiss_id = self._to_faiss_id(memory_id)
+        self._index.add_with_ids(vec, np.array([faiss_id], dtype=np.int64))
+        self._faiss_ids[faiss_id] = memory_id
+        self._tombstones.discard(faiss_id)
     
+    def _load_index(self):
+        """加载FAISS索引，并与向量存储对齐（补充缺失向量，标记已删除向量）"""
+        if os.path.exists(self.index_file):
+            try:
+                self._index = faiss.read_index(self.index_file)
+            except Exception:
+                self._index = None
+        
+        expected = {self._to_faiss_id(mid): mid for mid in self._ids}
+        indexed = set()
+        if self._index is not None:
+            indexed = set(faiss.vector_to_array(self._index.id_map).tolist())
+        
+        self._faiss_ids = {fid: mid for fid, mid in expected.items() if fid in indexed}
+        self._tombstones = indexed - expected.keys()
+        for fid, mid in expected.items():
+            if fid not in indexed:
+                self._index_add(mid, self.get(mid))
+        self._maybe_rebuild_index()
+    
+    def _save_index(self):
+        """保存FAISS索引（墓碑过多时先重建）"""
+        if self._index is None:
+            return
+        self._maybe_rebuild_index()
+        try:
+            _replace_atomically(self.index_file, lambda path: faiss.write_index(self._index, path))
+        except Exception as e:
+            print(f"Error saving vector index: {e}")
+    
+    def _maybe_rebuild_index(self):
+        """墓碑占比超过TOMBSTONE_REBUILD_RATIO时重建索引，使搜索的多取数量保持有界"""
+        if self._index is not None and \
+                len(self._tombstones) > self.TOMBSTONE_REBUILD_RATIO * self._index.ntotal:
+            self._rebuild_index()
+    
+    def _rebuild_index(self):
+        """根据当前向量重建FAISS索引，清除墓碑"""
+        self._index = None
+        self._faiss_ids = {}
+        self._tombstones = set()
+        for mid in self._ids:
+            self._index_add(mid, self.get(mid))
+    
+    def _matrix_add(self, memory_id: str, embedding: List[float]):
+        """向量化矩阵追加一行（容量按倍数增长，摊还O(d)）"""
+        vec = np.asarray(embedding, dtype=np.float32)
+        if vec.ndim != 1 or vec.size == 0:
+            return
+        if memory_id in self._row:
+            self._matrix_delete(memory_id)
+        if self._matrix is None:
+            self._matrix = np.zeros((16, vec.shape[0]), dtype=self.DTYPES[self.quantization])
+        elif vec.shape[0] != self._matrix.shape[1]:
+            return
+        size = len(self._ids)
+        if size == self._matrix.shape[0]:
+            self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+        self._matrix[size] = self._quantize(vec)
+        self._ids.append(memory_id)
+        self._row[memory_id] = size
+    
+    def _matrix_delete(self, memory_id: str):
+        """从量化矩阵删除一行（与末行交换，O(d)）"""
+        row = self._row.pop(memory_id, None)
+        if row is None:
+            return
+        last = len(self._ids) - 1
+        if row != last:
+            self._matrix[row] = self._matrix[last]
+            moved_id = self._ids[last]
+            self._ids[row] = moved_id
+            self._row[moved_id] = row
+        self._ids.pop()
+    
+    @_synchronized
     def add(self, memory_id: str, embedding: List[float]):
-        """添加向量"""
-        self.vectors[memory_id] = embedding
-        self.save_vectors()
+        """添加向量（写入前归一化）"""
+        embedding = self._normalize(embedding)
+        self._store_add(memory_id, embedding)
+        if FAISS_AVAILABLE:
+            self._index_add(memory_id, embedding)
+        self._append_log({"op": "add", "id": memory_id, "v": embedding})
+    
+    def _store_add(self, memory_id: str, embedding: List[float]):
+        """写入向量存储（不记日志、不更新索引）"""
+        if VECTOR_AVAILABLE:
+            self._matrix_add(memory_id, embedding)
+        else:
+            self.vectors[memory_id] = embedding
+    
+    def _store_delete(self, memory_id: str) -> bool:
+        """从向量存储删除，返回是否存在"""
+        existed = memory_id in self._row or memory_id in self.vectors
+        self.vectors.pop(memory_id, None)
+        if self._matrix is not None:
+            self._matrix_delete(memory_id)
+        return existed
     
     def get(self, memory_id: str) -> Optional[List[float]]:
         """获取向量"""
-        return self.vectors.get(memory_id)
+        if not VECTOR_AVAILABLE:
+            return self.vectors.get(memory_id)
+        row = self._row.get(memory_id)
+        if row is None:
+            return None
+        return self._dequantize(self._matrix[row]).tolist()
     
+    @_synchronized
     def delete(self, memory_id: str):
         """删除向量"""
-        self.vectors.pop(memory_id, None)
-        self.save_vectors()
+        existed = self._store_delete(memory_id)
+        if existed and self._index is not None:
+            faiss_id = self._to_faiss_id(memory_id)
+            self._faiss_ids.pop(faiss_id, None)
+            self._tombstones.add(faiss_id)
+            self._maybe_rebuild_index()
+        if existed:
+            self._append_log({"op": "delete", "id": memory_id})
     
+    @_synchronized
     def search(self, query_embedding: List[float], top_k: int = 10, 
                exclude_ids: List[str] = None) -> List[Tuple[str, float]]:
         """向量相似度搜索"""
-        if not VECTOR_AVAILABLE or TFIDF_AVAILABLE:
+        query_embedding = self._normalize(query_embedding)
+        if self._index is not None and self._faiss_ids:
+            return self._faiss_search(query_embedding, top_k, exclude_ids)
+        
+        if not VECTOR_AVAILABLE:
             # 使用TF-IDF作为后备
             return self._tfidf_search(query_embedding, top_k, exclude_ids)
         
-        results = []
-        exclude_ids = exclude_ids or []
+        return self._matrix_search(query_embedding, top_k, exclude_ids)
+    
+    def _matrix_scores(self, query: "np.ndarray") -> "np.ndarray":
+        """计算查询与全部向量的内积；量化矩阵分块反量化（int8且安装numba时用JIT内核），减少内存带宽"""
+        size = len(self._ids)
+        if self._matrix.dtype == np.float32:
+            return self._matrix[:size] @ query
+        
+        scores = np.empty(size, dtype=np.float32)
+        kernel = _get_int8_kernel() if self._matrix.dtype == np.int8 else None
+        if kernel is not None:
+            kernel(self._matrix[:size], query, scores)
+            scores *= 1.0 / self.INT8_SCALE
+            return scores
+        for start in range(0, size, self.SCORE_BLOCK):
+            end = min(start + self.SCORE_BLOCK, size)
+            scores[start:end] = self._matrix[start:end].astype(np.float32) @ query
+        if self.quantization == "int8":
+            scores *= 1.0 / self.INT8_SCALE
+        return scores
+    
+    def _matrix_search(self, query_embedding: List[float], top_k: int,
+                       exclude_ids: List[str] = None) -> List[Tuple[str, float]]:
+        """以矩阵乘法批量计算相似度（单位向量内积即余弦）"""
+        size = len(self._ids)
+        if size == 0 or not query_embedding:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape[0] != self._matrix.shape[1]:
+            return []
         
-        for mem_id, embedding in self.vectors.items():
-            if mem_id in exclude_ids:
-                continue
-            similarity = self._cosine_similarity(query_embedding, embedding)
-            results.append((mem_id, similarity))
+        sims = self._matrix_scores(query)
+        
+        excluded = [self._row[mid] for mid in set(exclude_ids or []) if mid in self._row]
+        if excluded:
+            sims[excluded] = -np.inf
+        
+        k = min(top_k, size - len(excluded))
+        if k <= 0:
+            return []
+        # argpartition取top_k为O(N)，仅对k个结果排序
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(self._ids[i], float(sims[i])) for i in top]
+    
+    def _faiss_search(self, query_embedding: List[float], top_k: int,
+                      exclude_ids: List[str] = None) -> List[Tuple[str, float]]:
+        """基于FAISS HNSW索引的近似最近邻搜索"""
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+        if query.shape[1] != self._index.d:
+            return []
+        
+        exclude = set(exclude_ids or [])
+        # 多取若干结果以抵消被排除及已删除的向量（墓碑部分有上限）
+        overfetch = min(len(self._tombstones), self.MAX_OVERFETCH)
+        k = min(top_k + len(exclude) + overfetch, self._index.ntotal)
+        scores, ids = self._index.search(query, k)
         
-        results.sort(key=lambda x: x[1], reverse=True)
-        return results[:top_k]
+        results = []
+        for faiss_id, score in zip(ids[0].tolist(), scores[0].tolist()):
+            mem_id = self._faiss_ids.get(faiss_id)
+            if mem_id is None or mem_id in exclude:
+                continue
+            exclude.add(mem_id)
+            results.append((mem_id, float(score)))
+            if len(results) >= top_k:
+                break
+        if len(results) < top_k and k < self._index.ntotal and self._matrix is not None:
+            # 多取的结果被墓碑占满，回退为精确的矩阵搜索
+            return self._matrix_search(query_embedding, top_k, exclude_ids)
+        return results
     
     def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """计算余弦相似度"""
         if not vec1 or not vec2:
             return 0.0
         
-        v1 = np.array(vec1)
-        v2 = np.array(vec2)
+        # vdot代替两次np.linalg.norm，两次开方合并为一次；已是float32数组时asarray不复制
+        v1 = np.asarray(vec1, dtype=np.float32)
+        v2 = np.asarray(vec2, dtype=np.float32)
         
-        dot = np.dot(v1, v2)
-        norm1 = np.linalg.norm(v1)
-        norm2 = np.linalg.norm(v2)
-        
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-        
-        return float(dot / (norm1 * norm2))
+        denom = np.sqrt(np.vdot(v1, v1) * np.vdot(v2, v2))
+        return 0.0 if denom == 0 else float(np.dot(v1, v2) / denom)
     
     def _tfidf_search(self, query_embedding: List[float], top_k: int,
                       exclude_ids: List[str] = None) -> List[Tuple[str, float]]:
         """TF-IDF搜索作为后备"""
         # 简化版本：基于存储的向量ID返回随机分数作为后备
         exclude_ids = exclude_ids or []
-        available = [mid for mid in self.vectors.keys() if mid not in exclude_ids]
+        available = [mid for mid in self.ids() if mid not in exclude_ids]
         
         if not available:
             return []
@@ -153,80 +680,6 @@ class VectorStore:
         return [(mid, 1.0) for mid in available[:top_k]]
 
 
-class KeywordIndexer:
-    """关键词索引器"""
-    
-    def __init__(self, storage_path: str):
-        self.storage_path = storage_path
-        self.index_file = os.path.join(storage_path, "keyword_index.json")
-        self.index: Dict[str, List[str]] = {}  # keyword -> memory_ids
-        self._load_index()
-    
-    def _load_index(self):
-        """加载索引"""
-        if os.path.exists(self.index_file):
-            try:
-                with open(self.index_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.index = {k: v for k, v in data.items()}
-            except Exception:
-                self.index = {}
-    
-    def _save_index(self):
-        """保存索引"""
-        try:
-            with open(self.index_file, 'w', encoding='utf-8') as f:
-                json.dump(self.index, f, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error saving keyword index: {e}")
-    
-    def _extract_keywords(self, text: str) -> List[str]:
-        """提取关键词"""
-        # 简单分词
-        words = re.findall(r'\b[a-zA-Z\u4e00-\u9fa5]+\b', text.lower())
-        # 过滤停用词
-        stopwords = {'的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一',
-                     'the', 'a', 'an', 'is', 'are', 'was', 'were', 'to', 'of', 'in', 'for',
-                     'and', 'or', 'but', 'on', 'at', 'by', 'with', 'this', 'that'}
-        keywords = [w for w in words if len(w) > 1 and w not in stopwords]
-        return list(set(keywords))
-    
-    def add(self, memory_id: str, content: str):
-        """添加索引"""
-        keywords = self._extract_keywords(content)
-        
-        for keyword in keywords:
-            if keyword not in self.index:
-                self.index[keyword] = []
-            if memory_id not in self.index[keyword]:
-                self.index[keyword].append(memory_id)
-        
-        self._save_index()
-    
-    def remove(self, memory_id: str):
-        """移除索引"""
-        for keyword in list(self.index.keys()):
-            if memory_id in self.index[keyword]:
-                self.index[keyword].remove(memory_id)
-            if not self.index[keyword]:
-                del self.index[keyword]
-        self._save_index()
-    
-    def search(self, query: str, top_k: int = 20) -> List[Tuple[str, int]]:
-        """关键词搜索"""
-        query_keywords = self._extract_keywords(query)
-        scores: Dict[str, int] = defaultdict(int)
-        
-        for keyword in query_keywords:
-            if keyword in self.index:
-                for mem_id in self.index[keyword]:
-                    scores[mem_id] += 1
-        
-        results = [(mid, score) for mid, score in scores.items()]
-        results.sort(key=lambda x: x[1], reverse=True)
-        return results[:top_k]
-
-
 class EnhancedMemory:
     """
     增强长期记忆模块
@@ -238,6 +691,14 @@ class EnhancedMemory:
     - 记忆压缩
     """
     
+    SCHEMA_VERSION = 1  # 数据库格式版本（PRAGMA user_version）
+    EMBED_BATCH_SIZE = 32  # 批量计算嵌入的记忆条数
+    FLUSH_INTERVAL = 30.0  # 后台落盘任务的间隔（秒）
+    QUERY_EMBED_CACHE_SIZE = 256  # 查询嵌入缓存条数
+    MEMORY_COLUMNS = (
+        "id, content, context, timestamp, layer, keywords, importance, access_count, last_access"
+    )
+    
     def __init__(
         self,
         storage_path: Optional[str] = None,
@@ -245,7 +706,9 @@ class EnhancedMemory:
         global_memories_limit: int = 5000,
         compression_threshold: int = 2000,
         enable_vector_search: bool = True,
-        enable_compression: bool = True
+        enable_compression: bool = True,
+        vector_quantization: str = "float16",
+        embedder: Optional[Callable[[List[str]], Any]] = None
     ):
         """
         初始化增强记忆模块
@@ -257,6 +720,9 @@ class EnhancedMemory:
             compression_threshold: 压缩阈值
             enable_vector_search: 启用向量搜索
             enable_compression: 启用自动压缩
+            vector_quantization: 向量量化精度 ('float32', 'float16', 'int8')
+            embedder: 文本嵌入函数，输入文本列表返回向量列表
+                （默认使用fastembed模型，未安装时仅使用关键词检索）
         """
         # 设置存储路径
         if storage_path:
@@ -272,27 +738,58 @@ class EnhancedMemory:
         self.compression_threshold = compression_threshold
         self.enable_vector_search = enable_vector_search
         self.enable_compression = enable_compression
+        self.vector_quantization = vector_quantization
         
         # 子索引
-        self.vector_store = VectorStore(str(self.storage_path))
-        self.keyword_indexer = KeywordIndexer(str(self.storage_path))
-        
-        # 数据库连接
+        self.vector_store = VectorStore(str(self.storage_path), vector_quantization)
+        
+        # 嵌入模型；新记忆排队，每EMBED_BATCH_SIZE条批量计算嵌入
+        self.embedder = embedder
+        self._pending_embeddings: List[Tuple[str, str]] = []
+        # 嵌入队列与查询嵌入缓存的锁（向量检索在线程池中执行）
+        self._embed_lock = threading.RLock()
+        self._query_embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+        # 进程退出前为排队中的记忆计算嵌入（在向量存储自身的退出处理之前执行）
+        atexit.register(self._flush_embeddings)
+        # 后台落盘任务（首次写入时在事件循环中启动）
+        self._flush_task: Optional[asyncio.Task] = None
+        # 写入后触发的压缩检查任务（保留引用，关闭时取消）
+        self._compression_tasks: set = set()
+        self._closed = False
+        
+        # 关键词检索已由SQLite FTS5承担，移除旧版JSON倒排索引文件
+        legacy_keyword_index = self.storage_path / "keyword_index.json"
+        if legacy_keyword_index.exists():
+            legacy_keyword_index.unlink()
+        
+        # 数据库连接（实例内复用；自动提交模式，WAL下读写互不阻塞）
         self.db_path = self.storage_path / "memories.db"
+        self._conn = sqlite3.connect(
+            str(self.db_path), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA temp_store=MEMORY')
+        # 串行化写操作
+        self._write_lock = asyncio.Lock()
         self._init_db()
         
-        # 缓存
-        self._cache = {}
+        # 记忆LRU缓存（memory_id -> Memory）
+        self._cache: "OrderedDict[str, Memory]" = OrderedDict()
         self._cache_max_size = 100
+        self._cache_hits = 0
+        self._cache_misses = 0
         
         # 初始化TF-IDF向量化器
         if TFIDF_AVAILABLE and enable_vector_search:
             self._init_tfidf()
+        
+        if enable_vector_search:
+            self._queue_missing_embeddings()
     
     def _init_db(self):
         """初始化SQLite数据库"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
         
         # 创建记忆表
         cursor.execute('''
@@ -315,8 +812,61 @@ class EnhancedMemory:
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_layer ON memories(layer)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_importance ON memories(importance)')
         
-        conn.commit()
-        conn.close()
+        self._migrate_schema(cursor)
+        
+        # 全文检索：FTS5外部内容表，由触发器与memories同步
+        try:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'memories_fts'")
+            fts_exists = cursor.fetchone() is not None
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
+                    content, content='memories', content_rowid='rowid', tokenize='unicode61'
+                )
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS memories_fts_insert AFTER INSERT ON memories BEGIN
+                    INSERT INTO memories_fts(rowid, content) VALUES (new.rowid, new.content);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS memories_fts_delete AFTER DELETE ON memories BEGIN
+                    INSERT INTO memories_fts(memories_fts, rowid, content)
+                    VALUES ('delete', old.rowid, old.content);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS memories_fts_update AFTER UPDATE OF content ON memories BEGIN
+                    INSERT INTO memories_fts(memories_fts, rowid, content)
+                    VALUES ('delete', old.rowid, old.content);
+                    INSERT INTO memories_fts(rowid, content) VALUES (new.rowid, new.content);
+                END
+            ''')
+            if not fts_exists:
+                # 为已有记忆建立全文索引
+                cursor.execute("INSERT INTO memories_fts(memories_fts) VALUES ('rebuild')")
+            self._fts_enabled = True
+        except sqlite3.OperationalError:
+            # SQLite未编译FTS5时回退到keywords列匹配
+            self._fts_enabled = False
+        
+    def _migrate_schema(self, cursor: sqlite3.Cursor):
+        """按PRAGMA user_version升级已有数据格式"""
+        cursor.execute('PRAGMA user_version')
+        if cursor.fetchone()[0] >= self.SCHEMA_VERSION:
+            return
+        
+        # v1: keywords列由JSON数组改为空格分隔（关键词本身不含空白）
+        cursor.execute('BEGIN')
+        cursor.execute("SELECT rowid, keywords FROM memories WHERE keywords LIKE '[%'")
+        updates = []
+        for rowid, keywords in cursor.fetchall():
+            try:
+                updates.append((" ".join(_json_loads(keywords)), rowid))
+            except ValueError:
+                updates.append(("", rowid))
+        cursor.executemany('UPDATE memories SET keywords = ? WHERE rowid = ?', updates)
+        cursor.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+        cursor.execute('COMMIT')
     
     def _init_tfidf(self):
         """初始化TF-IDF向量化器"""
@@ -337,11 +887,9 @@ class EnhancedMemory:
     
     def _get_all_contents(self) -> List[str]:
         """获取所有记忆内容"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
         cursor.execute('SELECT content FROM memories')
         contents = [row[0] for row in cursor.fetchall()]
-        conn.close()
         return contents
     
     def _generate_id(self) -> str:
@@ -354,7 +902,40 @@ class EnhancedMemory:
     
     def _extract_keywords(self, content: str) -> List[str]:
         """提取关键词"""
-        return self.keyword_indexer._extract_keywords(content)
+        return list(_tokenize(content))
+    
+    def _keyword_search(self, query: str, top_k: int = 20) -> List[Tuple[str, float]]:
+        """关键词搜索（FTS5 BM25排序，分数越大越相关）"""
+        query_keywords = _tokenize(query)
+        if not query_keywords:
+            return []
+        
+        cursor = self._conn.cursor()
+        
+        if self._fts_enabled:
+            match = " OR ".join('"' + kw.replace('"', '""') + '"' for kw in query_keywords)
+            cursor.execute('''
+                SELECT memories.id, bm25(memories_fts)
+                FROM memories_fts
+                JOIN memories ON memories.rowid = memories_fts.rowid
+                WHERE memories_fts MATCH ?
+                ORDER BY bm25(memories_fts)
+                LIMIT ?
+            ''', (match, top_k))
+            results = [(mid, -score) for mid, score in cursor.fetchall()]
+        else:
+            # 按命中的关键词个数打分
+            score_sql = " + ".join("(' ' || keywords || ' ' LIKE ?)" for _ in query_keywords)
+            cursor.execute(f'''
+                SELECT id, {score_sql} AS score
+                FROM memories
+                WHERE score > 0
+                ORDER BY score DESC
+                LIMIT ?
+            ''', [f'% {kw} %' for kw in query_keywords] + [top_k])
+            results = [(mid, float(score)) for mid, score in cursor.fetchall()]
+        
+        return results
     
     def _calculate_importance(self, content: str, context: Dict[str, Any]) -> float:
         """计算记忆重要性分数"""
@@ -380,19 +961,157 @@ class EnhancedMemory:
         # 限制在0-1范围内
         return min(1.0, max(0.0, score))
     
-    def _create_embedding(self, content: str) -> Optional[List[float]]:
-        """创建内容嵌入向量"""
-        if not self.enable_vector_search:
+    def _get_embedder(self) -> Optional[Callable[[List[str]], Any]]:
+        """获取嵌入函数（首次使用时加载默认fastembed模型）"""
+        if self.embedder is None and FASTEMBED_AVAILABLE:
+            try:
+                model = TextEmbedding(DEFAULT_EMBEDDING_MODEL)
+            except Exception as e:
+                print(f"Error loading embedding model: {e}")
+                self.enable_vector_search = False
+                return None
+            self.embedder = lambda texts: list(model.embed(texts))
+        return self.embedder
+    
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """批量计算文本嵌入（无可用嵌入模型时返回空列表）"""
+        if not self.enable_vector_search or not texts:
+            return []
+        embedder = self._get_embedder()
+        if embedder is None:
+            return []
+        return [
+            vector.tolist() if hasattr(vector, "tolist") else list(vector)
+            for vector in embedder(texts)
+        ]
+    
+    def _embed_query(self, query: str) -> Optional[List[float]]:
+        """计算查询嵌入（按查询文本LRU缓存，重复查询不再调用模型）"""
+        with self._embed_lock:
+            embedding = self._query_embeddings.get(query)
+            if embedding is not None:
+                self._query_embeddings.move_to_end(query)
+                return embedding
+            embeddings = self._embed_texts([query])
+            if not embeddings:
+                return None
+            self._query_embeddings[query] = embeddings[0]
+            if len(self._query_embeddings) > self.QUERY_EMBED_CACHE_SIZE:
+                self._query_embeddings.popitem(last=False)
+            return embeddings[0]
+    
+    def _queue_missing_embeddings(self):
+        """将数据库中没有向量的记忆（如上次未落盘即退出）重新排队计算嵌入"""
+        stored = set(self.vector_store.ids())
+        missing = [
+            (memory_id, content)
+            for memory_id, content in self._conn.execute('SELECT id, content FROM memories')
+            if memory_id not in stored
+        ]
+        if missing:
+            with self._embed_lock:
+                self._pending_embeddings.extend(missing)
+    
+    def _flush_embeddings(self):
+        """为排队中的记忆计算嵌入并写入向量索引"""
+        with self._embed_lock:
+            if not self._pending_embeddings:
+                return
+            pending, self._pending_embeddings = self._pending_embeddings, []
+            embeddings = self._embed_texts([content for _, content in pending])
+            if embeddings and self.vector_store.dim not in (None, len(embeddings[0])):
+                # 嵌入维度变化（更换了模型），旧向量不可比，清空后重建
+                self.vector_store.reset()
+            for (memory_id, _), embedding in zip(pending, embeddings):
+                self.vector_store.add(memory_id, embedding)
+    
+    def _vector_search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """向量检索：先为排队中的记忆计算嵌入，再按查询嵌入搜索"""
+        self._flush_embeddings()
+        query_embedding = self._embed_query(query)
+        if not query_embedding:
+            return []
+        return self.vector_store.search(query_embedding, top_k)
+    
+    @staticmethod
+    def _row_to_memory(row: tuple) -> Optional[Memory]:
+        """由MEMORY_COLUMNS顺序的行构建记忆对象（context损坏时返回None）"""
+        try:
+            context = _json_loads(row[2]) if row[2] else {}
+        except ValueError:
             return None
+        return Memory(
+            id=row[0],
+            content=row[1],
+            context=context,
+            timestamp=row[3],
+            layer=row[4],
+            keywords=row[5].split() if row[5] else [],
+            importance=row[6],
+            access_count=row[7],
+            last_access=row[8]
+        )
+    
+    @staticmethod
+    def _copy_memory(memory: Memory) -> Memory:
+        """复制记忆对象（上下文、关键词与向量各自独立）"""
+        return replace(
+            memory,
+            context=copy.deepcopy(memory.context),
+            keywords=list(memory.keywords),
+            embedding=list(memory.embedding) if memory.embedding is not None else None
+        )
+    
+    def _cache_put(self, memory: Memory):
+        """写入LRU缓存（保存副本，调用方修改返回的对象不影响缓存），超出容量时淘汰最久未使用的记忆"""
+        self._cache[memory.id] = self._copy_memory(memory)
+        self._cache.move_to_end(memory.id)
+        if len(self._cache) > self._cache_max_size:
+            self._cache.popitem(last=False)
+    
+    def _load_memories(self, memory_ids: List[str]) -> List[Memory]:
+        """批量读取记忆：先查LRU缓存（返回副本），未命中的以一条查询读取并写入缓存"""
+        memories = []
+        missing = []
+        for memory_id in memory_ids:
+            memory = self._cache.get(memory_id)
+            if memory is None:
+                missing.append(memory_id)
+            else:
+                self._cache.move_to_end(memory_id)
+                memories.append(self._copy_memory(memory))
+        self._cache_hits += len(memories)
+        self._cache_misses += len(missing)
+        
+        if missing:
+            cursor = self._conn.execute(f'''
+                SELECT {self.MEMORY_COLUMNS}
+                FROM memories
+                WHERE id IN ({','.join('?' * len(missing))})
+            ''', missing)
+            for row in cursor:
+                memory = self._row_to_memory(row)
+                if memory is not None:
+                    self._cache_put(memory)
+                    memories.append(memory)
+        return memories
+    
+    def _load_memory(self, memory_id: str) -> Optional[Memory]:
+        """读取单条记忆（经LRU缓存）"""
+        memories = self._load_memories([memory_id])
+        return memories[0] if memories else None
+    
+    async def get(self, memory_id: str) -> Optional[Memory]:
+        """
+        获取指定记忆
         
-        # 简单词袋模型作为后备
-        words = set(re.findall(r'\b[a-zA-Z]+\b', content.lower()))
-        embedding = [0.0] * 100
-        
-        for i, word in enumerate(list(words)[:100]):
-            embedding[i] = hash(word) % 1000 / 1000.0
-        
-        return embedding
+        Args:
+            memory_id: 记忆ID
+            
+        Returns:
+            记忆对象，不存在时为None
+        """
+        return self._load_memory(memory_id)
     
     async def remember(self, content: str, context: Optional[Dict[str, Any]] = None) -> str:
         """
@@ -413,54 +1132,138 @@ class EnhancedMemory:
         layer = "global" if context.get("global_level") else "daily"
         keywords = self._extract_keywords(content)
         importance = self._calculate_importance(content, context)
-        embedding = self._create_embedding(content)
         
         # 保存到数据库
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+        async with self._write_lock:
+            self._conn.execute('''
+                INSERT INTO memories 
+                (id, content, context, timestamp, layer, keywords, importance, access_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+            ''', (
+                memory_id,
+                content,
+                _json_dumps(context),
+                timestamp,
+                layer,
+                " ".join(keywords),
+                importance
+            ))
+        
+        # 排队计算嵌入，攒满一批再写入向量索引（关键词索引由FTS5触发器维护）
+        if self.enable_vector_search:
+            with self._embed_lock:
+                self._pending_embeddings.append((memory_id, content))
+                batch_full = len(self._pending_embeddings) >= self.EMBED_BATCH_SIZE
+            if batch_full:
+                # 模型推理在线程池中执行，不阻塞事件循环
+                await asyncio.to_thread(self._flush_embeddings)
         
-        cursor.execute('''
-            INSERT INTO memories 
-            (id, content, context, timestamp, layer, keywords, importance, access_count)
-            VALUES (?, ?, ?, ?, ?, ?, ?, 0)
-        ''', (
-            memory_id,
-            content,
-            json.dumps(context, ensure_ascii=False),
-            timestamp,
-            layer,
-            json.dumps(keywords, ensure_ascii=False),
-            importance
+        # 更新缓存
+        self._cache_put(Memory(
+            id=memory_id,
+            content=content,
+            context=context,
+            timestamp=timestamp,
+            layer=layer,
+            keywords=keywords,
+            importance=importance
         ))
         
-        conn.commit()
-        conn.close()
+        self._ensure_flush_task()
         
-        # 更新索引
-        self.keyword_indexer.add(memory_id, content)
+        # 检查是否需要压缩
+        if self.enable_compression:
+            self._schedule_compression_check()
         
-        if embedding:
-            self.vector_store.add(memory_id, embedding)
+        return memory_id
+    
+    async def _remember_bulk(self, items: List[Dict[str, Any]]) -> List[str]:
+        """
+        批量存储记忆（单个事务executemany写入，嵌入批量计算，向量日志最后统一落盘）
         
-        # 更新缓存
-        self._cache[memory_id] = {
-            "content": content,
-            "context": context,
-            "timestamp": timestamp,
-            "layer": layer,
-            "keywords": keywords,
-            "importance": importance
-        }
+        Args:
+            items: 记忆列表，每项包含content与可选的context
+            
+        Returns:
+            记忆ID列表
+        """
+        rows = [self._memory_row(item["content"], item.get("context")) for item in items]
+        return await self._insert_rows(rows)
+    
+    def _memory_row(self, content: str, context: Optional[Dict[str, Any]]) -> Tuple:
+        """构建待写入的记忆行，内容或上下文类型不正确时抛出TypeError"""
+        context = context or {}
+        if not isinstance(content, str):
+            raise TypeError(f"记忆内容应为字符串，实际为 {type(content).__name__}")
+        if not isinstance(context, dict):
+            raise TypeError(f"记忆上下文应为字典，实际为 {type(context).__name__}")
+        return (
+            self._generate_id(),
+            content,
+            _json_dumps(context),
+            datetime.now().isoformat(),
+            "global" if context.get("global_level") else "daily",
+            " ".join(self._extract_keywords(content)),
+            self._calculate_importance(content, context)
+        )
+    
+    async def _insert_rows(self, rows: List[Tuple]) -> List[str]:
+        """在单个事务中写入记忆行，批量计算嵌入并落盘，返回记忆ID列表"""
+        if not rows:
+            return []
         
-        # 清理缓存
-        if len(self._cache) > self._cache_max_size:
-            self._cache.pop(next(iter(self._cache)))
+        async with self._write_lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany('''
+                    INSERT INTO memories 
+                    (id, content, context, timestamp, layer, keywords, importance, access_count)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+                ''', rows)
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        
+        # 一次性批量计算嵌入并写入向量索引（关键词索引由FTS5触发器维护）
+        if self.enable_vector_search:
+            with self._embed_lock:
+                self._pending_embeddings.extend((row[0], row[1]) for row in rows)
+            await asyncio.to_thread(self._flush_embeddings)
+        self.vector_store.flush()
+        self._ensure_flush_task()
         
         # 检查是否需要压缩
         if self.enable_compression:
-            asyncio.create_task(self._check_compression())
+            self._schedule_compression_check()
         
-        return memory_id
+        return [row[0] for row in rows]
+    
+    def _schedule_compression_check(self):
+        """在后台检查是否需要压缩"""
+        task = asyncio.create_task(self._check_compression())
+        self._compression_tasks.add(task)
+        task.add_done_callback(self._compression_tasks.discard)
+    
+    def _ensure_flush_task(self):
+        """启动后台落盘任务（已在运行时忽略）"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def _flush_loop(self):
+        """定期计算排队中的嵌入、向量日志落盘，日志过长时压缩为快照"""
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            try:
+                await asyncio.to_thread(self._background_flush)
+            except Exception as e:
+                print(f"Error flushing memory store: {e}")
+    
+    def _background_flush(self):
+        """后台落盘（在线程池中执行）"""
+        self._flush_embeddings()
+        self.vector_store.flush()
+        self.vector_store.maybe_compact()
     
     async def recall(self, query: str, layer: Optional[str] = None, 
                      top_k: int = 10, use_hybrid: bool = True) -> List[Memory]:
@@ -476,104 +1279,76 @@ class EnhancedMemory:
         Returns:
             匹配的记忆列表
         """
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-        
-        # 构建查询条件
-        where_clauses = []
-        params = []
-        
-        if layer:
-            where_clauses.append("layer = ?")
-            params.append(layer)
-        
-        where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
-        
-        # 获取所有候选记忆
-        cursor.execute(f'''
-            SELECT id, content, context, timestamp, layer, keywords, importance, 
-                   access_count, last_access
-            FROM memories 
-            WHERE {where_sql}
-            ORDER BY importance DESC, timestamp DESC
-        ''', params)
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        # 检索结果
-        results: List[Tuple[Memory, float]] = []
-        seen_ids = set()
-        
         if use_hybrid and self.enable_vector_search:
-            # 混合检索
-            vector_results = set()
-            keyword_results = set()
-            
-            # 向量搜索
-            embedding = self._create_embedding(query)
-            if embedding:
-                vector_matches = self.vector_store.search(embedding, top_k * 2)
-                vector_results = {mid for mid, _ in vector_matches}
-            
-            # 关键词搜索
-            keyword_matches = self.keyword_indexer.search(query, top_k * 2)
-            keyword_results = {mid for mid, _ in keyword_matches}
+            # 混合检索：向量搜索与关键词搜索相互独立，在线程池中并发执行
+            vector_matches, keyword_matches = await asyncio.gather(
+                asyncio.to_thread(self._vector_search, query, top_k * 2),
+                asyncio.to_thread(self._keyword_search, query, top_k * 2)
+            )
             
             # 合并结果
-            candidate_ids = list(vector_results | keyword_results)
+            candidate_ids = list(
+                {mid for mid, _ in vector_matches} | {mid for mid, _ in keyword_matches}
+            )
         else:
             # 简单关键词搜索
-            keyword_matches = self.keyword_indexer.search(query, top_k * 2)
+            keyword_matches = await asyncio.to_thread(self._keyword_search, query, top_k * 2)
             candidate_ids = [mid for mid, _ in keyword_matches]
         
-        # 构建记忆对象
-        for row in rows:
-            mem_id = row[0]
-            
-            if candidate_ids and mem_id not in candidate_ids:
-                continue
-            
-            try:
-                context = json.loads(row[2]) if row[2] else {}
-                keywords = json.loads(row[5]) if row[5] else []
-                
-                memory = Memory(
-                    id=mem_id,
-                    content=row[1],
-                    context=context,
-                    timestamp=row[3],
-                    layer=row[4],
-                    keywords=keywords,
-                    importance=row[6],
-                    access_count=row[7],
-                    last_access=row[8]
-                )
-                
-                # 计算相关性分数
-                score = self._calculate_relevance(query, memory.content, keywords)
-                results.append((memory, score))
-                seen_ids.add(mem_id)
-            except Exception:
-                continue
-        
-        # 排序并返回
-        results.sort(key=lambda x: x[1], reverse=True)
+        query_lower = query.lower()
+        query_words = frozenset(_tokenize(query))
+        
+        if candidate_ids:
+            # 候选记忆优先从LRU缓存读取；先按重要性、时间排序，使同分结果保持原有先后
+            candidates = [
+                memory for memory in self._load_memories(candidate_ids)
+                if not layer or memory.layer == layer
+            ]
+            candidates.sort(key=lambda m: (m.importance, m.timestamp), reverse=True)
+            scored = [
+                (self._calculate_relevance(query_lower, query_words, m.content, m.keywords), m)
+                for m in candidates
+            ]
+            # nlargest等价于稳定排序后取前top_k，复杂度O(N log k)
+            results = [memory for _, memory in heapq.nlargest(top_k, scored, key=itemgetter(0))]
+        else:
+            # 无候选时回退为全表扫描
+            results = self._scan_memories(query_lower, query_words, layer, top_k)
         
         # 更新访问计数
-        for memory, _ in results[:top_k]:
-            await self._update_access(memory.id)
+        await self._update_access([memory.id for memory in results])
         
-        return [mem for mem, _ in results[:top_k]]
+        return results
     
-    def _calculate_relevance(self, query: str, content: str, keywords: List[str]) -> float:
-        """计算相关性分数"""
-        query_lower = query.lower()
-        query_words = set(self._extract_keywords(query))
-        
+    def _scan_memories(self, query_lower: str, query_words: frozenset,
+                       layer: Optional[str], top_k: int) -> List[Memory]:
+        """全表扫描打分（只拆分keywords，context留到构建返回结果时再解析）"""
+        where_sql = "layer = ?" if layer else "1=1"
+        cursor = self._conn.execute(f'''
+            SELECT {self.MEMORY_COLUMNS}
+            FROM memories 
+            WHERE {where_sql}
+            ORDER BY importance DESC, timestamp DESC
+        ''', (layer,) if layer else ())
+        
+        scored: List[Tuple[float, tuple]] = []
+        for row in cursor:
+            keywords = row[5].split() if row[5] else []
+            scored.append((self._calculate_relevance(query_lower, query_words, row[1], keywords), row))
+        
+        results: List[Memory] = []
+        for _, row in heapq.nlargest(top_k, scored, key=itemgetter(0)):
+            memory = self._row_to_memory(row)
+            if memory is not None:
+                self._cache_put(memory)
+                results.append(memory)
+        return results
+    
+    def _calculate_relevance(self, query_lower: str, query_words: frozenset,
+                             content: str, keywords: List[str]) -> float:
+        """计算相关性分数（查询的小写形式与关键词集合由调用方预先计算）"""
         # 关键词匹配
-        content_words = set(keywords)
-        keyword_match = len(query_words & content_words) / max(len(query_words), 1)
+        keyword_match = len(query_words.intersection(keywords)) / max(len(query_words), 1)
         
         # 内容包含
         content_lower = content.lower()
@@ -582,21 +1357,28 @@ class EnhancedMemory:
         # 组合分数
         return keyword_match * 0.6 + content_match * 0.4
     
-    async def _update_access(self, memory_id: str):
-        """更新访问信息"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE memories 
-            SET access_count = access_count + 1,
-                last_access = ?
-            WHERE id = ?
-        ''', (datetime.now().isoformat(), memory_id))
+    async def _update_access(self, memory_ids: List[str]):
+        """批量更新访问信息（单条UPDATE）"""
+        if not memory_ids:
+            return
+        placeholders = ",".join("?" * len(memory_ids))
+        last_access = datetime.now().isoformat()
+        async with self._write_lock:
+            await asyncio.to_thread(self._conn.execute, f'''
+                UPDATE memories 
+                SET access_count = access_count + 1,
+                    last_access = ?
+                WHERE id IN ({placeholders})
+            ''', [last_access, *memory_ids])
+        
+        # 同步缓存中的访问信息（替换缓存条目，已返回给调用方的对象不变）
+        for memory_id in memory_ids:
+            memory = self._cache.get(memory_id)
+            if memory is not None:
+                self._cache[memory_id] = replace(
+                    memory, access_count=memory.access_count + 1, last_access=last_access
+                )
         
-        conn.commit()
-        conn.close()
-    
     async def compress(self, strategy: str = "importance") -> Dict[str, Any]:
         """
         记忆压缩
@@ -610,89 +1392,31 @@ class EnhancedMemory:
         Returns:
             压缩统计信息
         """
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-        
-        # 获取所有记忆
-        cursor.execute('''
-            SELECT id, content, context, timestamp, layer, keywords, importance, access_count
-            FROM memories
-            ORDER BY timestamp DESC
-        ''')
+        deleted_ids: List[str] = []
         
-        rows = cursor.fetchall()
-        all_memories = []
-        
-        for row in rows:
-            try:
-                context = json.loads(row[2]) if row[2] else {}
-                keywords = json.loads(row[5]) if row[5] else []
-                
-                all_memories.append({
-                    "id": row[0],
-                    "content": row[1],
-                    "context": context,
-                    "timestamp": row[3],
-                    "layer": row[4],
-                    "keywords": keywords,
-                    "importance": row[6],
-                    "access_count": row[7]
-                })
-            except Exception:
-                continue
-        
-        conn.close()
-        
-        # 按层分组
-        daily_memories = [m for m in all_memories if m["layer"] == "daily"]
-        global_memories = [m for m in all_memories if m["layer"] == "global"]
-        
-        deleted_ids = []
+        # 各层按重要性、访问次数保留前N条（同分保留较新的），其余在SQL内直接删除
+        async with self._write_lock:
+            for layer, limit in (
+                ("daily", self.max_daily_memories),
+                ("global", self.global_memories_limit)
+            ):
+                deleted_ids.extend(self._delete_excess(layer, limit))
         
-        # 压缩每日记忆
-        if len(daily_memories) > self.max_daily_memories:
-            # 按重要性和访问频率排序
-            daily_memories.sort(
-                key=lambda x: (x["importance"], x["access_count"]),
-                reverse=True
-            )
-            
-            # 删除超出的记忆
-            to_delete = daily_memories[self.max_daily_memories:]
-            deleted_ids.extend(m["id"] for m in to_delete)
-        
-        # 压缩全局记忆
-        if len(global_memories) > self.global_memories_limit:
-            global_memories.sort(
-                key=lambda x: (x["importance"], x["access_count"]),
-                reverse=True
-            )
-            
-            to_delete = global_memories[self.global_memories_limit:]
-            deleted_ids.extend(m["id"] for m in to_delete)
-        
-        # 删除记忆
         if deleted_ids:
-            conn = sqlite3.connect(str(self.db_path))
-            cursor = conn.cursor()
-            
-            placeholders = ",".join("?" * len(deleted_ids))
-            cursor.execute(f"DELETE FROM memories WHERE id IN ({placeholders})", deleted_ids)
-            
-            conn.commit()
-            conn.close()
-            
-            # 清理索引
+            # 清理向量索引及嵌入队列（关键词索引由FTS5触发器维护）
+            deleted = set(deleted_ids)
+            with self._embed_lock:
+                self._pending_embeddings = [
+                    item for item in self._pending_embeddings if item[0] not in deleted
+                ]
             for mem_id in deleted_ids:
-                self.keyword_indexer.remove(mem_id)
                 self.vector_store.delete(mem_id)
+                self._cache.pop(mem_id, None)
         
         # 计算统计信息
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
         cursor.execute('SELECT COUNT(*) FROM memories')
         remaining_count = cursor.fetchone()[0]
-        conn.close()
         
         return {
             "deleted_count": len(deleted_ids),
@@ -701,21 +1425,40 @@ class EnhancedMemory:
             "timestamp": datetime.now().isoformat()
         }
     
+    def _delete_excess(self, layer: str, limit: int) -> List[str]:
+        """删除指定层超出保留数量的记忆，返回被删除的ID"""
+        excess_sql = '''
+            SELECT id FROM memories
+            WHERE layer = ?
+            ORDER BY importance DESC, access_count DESC, timestamp DESC
+            LIMIT -1 OFFSET ?
+        '''
+        if _SQLITE_RETURNING:
+            cursor = self._conn.execute(
+                f"DELETE FROM memories WHERE id IN ({excess_sql}) RETURNING id", (layer, limit)
+            )
+            return [row[0] for row in cursor.fetchall()]
+        
+        deleted_ids = [row[0] for row in self._conn.execute(excess_sql, (layer, limit))]
+        if deleted_ids:
+            placeholders = ",".join("?" * len(deleted_ids))
+            self._conn.execute(f"DELETE FROM memories WHERE id IN ({placeholders})", deleted_ids)
+        return deleted_ids
+    
     async def _check_compression(self):
-        """检查是否需要压缩"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+        """检查是否需要压缩（连接已关闭时直接返回）"""
+        if self._closed:
+            return
+        cursor = self._conn.cursor()
         cursor.execute('SELECT COUNT(*) FROM memories')
         count = cursor.fetchone()[0]
-        conn.close()
         
         if count >= self.compression_threshold:
             await self.compress()
     
     async def get_stats(self) -> Dict[str, Any]:
         """获取记忆统计"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
         
         # 总数
         cursor.execute('SELECT COUNT(*) FROM memories')
@@ -746,13 +1489,17 @@ class EnhancedMemory:
         ''')
         importance_dist = dict(cursor.fetchall())
         
-        conn.close()
-        
         return {
             "total_memories": total,
             "layer_distribution": layer_stats,
             "total_access_count": total_access,
             "importance_distribution": importance_dist,
+            "cache_stats": {
+                "size": len(self._cache),
+                "hits": self._cache_hits,
+                "misses": self._cache_misses,
+                "hit_rate": self._cache_hits / max(self._cache_hits + self._cache_misses, 1)
+            },
             "storage_path": str(self.storage_path)
         }
     
@@ -766,21 +1513,17 @@ class EnhancedMemory:
         Returns:
             删除的记忆数量
         """
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-        
-        if layer:
-            cursor.execute('DELETE FROM memories WHERE layer = ?', (layer,))
-        else:
-            cursor.execute('DELETE FROM memories')
-        
-        deleted_count = cursor.rowcount
-        conn.commit()
-        conn.close()
+        async with self._write_lock:
+            if layer:
+                cursor = self._conn.execute('DELETE FROM memories WHERE layer = ?', (layer,))
+            else:
+                cursor = self._conn.execute('DELETE FROM memories')
+            deleted_count = cursor.rowcount
         
         # 清理索引
-        self.keyword_indexer = KeywordIndexer(str(self.storage_path))
-        self.vector_store = VectorStore(str(self.storage_path))
+        await asyncio.to_thread(self._flush_embeddings)
+        self.vector_store.close()
+        self.vector_store = VectorStore(str(self.storage_path), self.vector_quantization)
         
         # 清理缓存
         self._cache.clear()
@@ -795,8 +1538,7 @@ class EnhancedMemory:
             file_path: 导出路径
             layer: 指定层
         """
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
         
         if layer:
             cursor.execute('SELECT * FROM memories WHERE layer = ?', (layer,))
@@ -805,7 +1547,6 @@ class EnhancedMemory:
         
         rows = cursor.fetchall()
         columns = [desc[0] for desc in cursor.description]
-        conn.close()
         
         data = {
             "export_time": datetime.now().isoformat(),
@@ -815,7 +1556,7 @@ class EnhancedMemory:
         }
         
         with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write(_json_dumps(data, indent=True))
     
     async def import_memories(self, file_path: str) -> int:
         """
@@ -828,22 +1569,44 @@ class EnhancedMemory:
             导入的记忆数量
         """
         with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+            data = _json_loads(f.read())
         
-        memories = data.get("memories", [])
-        imported = 0
-        
-        for mem_data in memories:
+        # 逐条校验并构建记忆行，无法导入的记录跳过
+        rows = []
+        for mem_data in data.get("memories", []):
             try:
-                await self.remember(
-                    content=mem_data.get("content", ""),
-                    context=json.loads(mem_data.get("context", "{}"))
-                )
-                imported += 1
+                rows.append(self._memory_row(
+                    mem_data.get("content", ""),
+                    _json_loads(mem_data.get("context") or "{}")
+                ))
             except Exception:
                 continue
         
-        return imported
+        return len(await self._insert_rows(rows))
+    
+    def close(self):
+        """停止后台任务，写入排队中的嵌入，关闭数据库连接并压缩向量日志"""
+        if self._closed:
+            return
+        self._closed = True
+        for task in self._compression_tasks:
+            task.cancel()
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        atexit.unregister(self._flush_embeddings)
+        self._flush_embeddings()
+        self.vector_store.close()
+        self._conn.close()
+    
+    async def __aenter__(self) -> "EnhancedMemory":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        pending = list(self._compression_tasks)
+        self.close()
+        # 等待已取消的压缩检查任务结束
+        await asyncio.gather(*pending, return_exceptions=True)
 
 
 # 便捷函数
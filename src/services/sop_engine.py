@@ -3,15 +3,99 @@ MetaGPT SOP Engine - 标准化流程引擎
 基于MetaGPT SOP模式创建的智能体协作流程引擎
 """
 
-from typing import List, Dict, Any, Optional, Callable
-from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
 from enum import Enum
 import asyncio
+import copy
+import hashlib
+import inspect
 import json
+import re
+import time
 from datetime import datetime
 from abc import ABC, abstractmethod
 
 
+def format_timestamp_ns(timestamp_ns: int) -> str:
+    """将纳秒时间戳格式化为ISO格式字符串"""
+    return datetime.fromtimestamp(timestamp_ns / 1e9).isoformat()
+
+
+# 步骤输入中与任务无关的稳定字段（见SOPEngine._prepare_input）
+_STABLE_INPUT_KEYS = ("step_id", "role_description", "capabilities")
+_CACHE_CONTROL = {"type": "ephemeral"}
+
+@lru_cache(maxsize=256)
+def _format_default_content(agent_name: str, specialty: str, step_name: str) -> str:
+    """默认执行逻辑的输出内容（智能体与步骤固定时跨执行复用同一字符串）"""
+    return f"由 {agent_name} ({specialty}) 执行的 {step_name} 步骤"
+
+
+# 缓存未命中标记
+_MISSING = object()
+
+# 不可变的基本类型，复制时直接共享
+_ATOMIC_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+def _deepcopy_plain(value: Any, memo: Dict[int, Any]) -> Any:
+    """深拷贝由dict/list与基本类型组成的结构（按memo保留共享引用），其他类型交给copy.deepcopy"""
+    value_type = type(value)
+    if value_type in _ATOMIC_TYPES:
+        return value
+    copied = memo.get(id(value))
+    if copied is not None:
+        return copied
+    if value_type is dict:
+        copied = memo[id(value)] = {}
+        for key, item in value.items():
+            copied[key] = item if type(item) in _ATOMIC_TYPES else _deepcopy_plain(item, memo)
+    elif value_type is list:
+        copied = memo[id(value)] = []
+        for item in value:
+            copied.append(item if type(item) in _ATOMIC_TYPES else _deepcopy_plain(item, memo))
+    else:
+        copied = copy.deepcopy(value, memo)
+    return copied
+
+# 预处理后的回调表：步骤ID -> (回调函数, 是否为协程函数)
+_PreparedCallbacks = Dict[str, Tuple[Callable, bool]]
+
+
+def build_prompt(input_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    将步骤输入构造为Anthropic消息内容块
+    
+    按稳定字段、依赖输出、任务的顺序拼接，在稳定段与依赖段末尾插入
+    cache_control缓存断点，任务等易变内容放在断点之后。
+    """
+    def render(items: List[Tuple[str, Any]]) -> str:
+        lines = []
+        for key, value in items:
+            if not isinstance(value, str):
+                # 键排序保证相同内容序列化结果一致
+                value = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+            lines.append(f"{key}: {value}")
+        return "\n".join(lines)
+    
+    stable = [(key, input_data[key]) for key in _STABLE_INPUT_KEYS if key in input_data]
+    dependencies = [
+        (key, value) for key, value in input_data.items()
+        if key not in _STABLE_INPUT_KEYS and key != "task"
+    ]
+    
+    blocks: List[Dict[str, Any]] = []
+    for section in (stable, dependencies):
+        if section:
+            blocks.append({"type": "text", "text": render(section), "cache_control": _CACHE_CONTROL})
+    if "task" in input_data:
+        blocks.append({"type": "text", "text": render([("task", input_data["task"])])})
+    return blocks
+
+
 class AgentRole(Enum):
     """智能体角色枚举"""
     STRATEGY_DESIGN = "strategy_design"      # 策略设计
@@ -20,7 +104,21 @@ class AgentRole(Enum):
     GENERAL = "general"                       # 通用
 
 
-@dataclass
+# 专业领域关键词 -> 角色（define_role按关键词自动分配角色）
+_TOKEN_TO_ROLE = {
+    "策略": AgentRole.STRATEGY_DESIGN,
+    "战略": AgentRole.STRATEGY_DESIGN,
+    "推演": AgentRole.PLAN_EVALUATION,
+    "方案": AgentRole.PLAN_EVALUATION,
+    "评估": AgentRole.PLAN_EVALUATION,
+    "风险": AgentRole.RISK_ASSESSMENT,
+}
+_ROLE_REGEX = re.compile("|".join(map(re.escape, _TOKEN_TO_ROLE)))
+# 同时命中多个角色的关键词时按此顺序取第一个
+_ROLE_PRIORITY = (AgentRole.STRATEGY_DESIGN, AgentRole.PLAN_EVALUATION, AgentRole.RISK_ASSESSMENT)
+
+
+@dataclass(slots=True)
 class Agent:
     """智能体数据类"""
     name: str                    # 智能体名称
@@ -30,7 +128,7 @@ class Agent:
     capabilities: List[str] = field(default_factory=list)  # 能力列表
 
 
-@dataclass
+@dataclass(slots=True)
 class SOPStep:
     """SOP步骤数据类"""
     step_id: str
@@ -41,25 +139,126 @@ class SOPStep:
     input_template: str = ""
     output_template: str = ""
     async_execute: Optional[Callable] = None
+    cacheable: bool = False      # 执行函数或回调的输出可跨执行复用（默认每次都调用）
+    critical: bool = False       # 关键步骤，执行失败时终止整个流程
 
 
-@dataclass
+@dataclass(slots=True)
+class StepExecution:
+    """步骤执行记录（执行期间使用，输出结果时转换为字典）"""
+    step_id: str
+    name: str
+    status: str = "pending"
+    output: Any = None
+    error: Optional[str] = None
+    agent: Optional[str] = None
+    timestamp_ns: int = 0        # 步骤结束时间（纳秒），需要时再格式化
+    duration_ns: int = 0         # 步骤执行耗时（纳秒，单调时钟）
+    _timestamp: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    
+    @property
+    def timestamp(self) -> Optional[str]:
+        """步骤结束时间（ISO格式，首次访问时格式化）"""
+        if self._timestamp is None and self.timestamp_ns:
+            self._timestamp = format_timestamp_ns(self.timestamp_ns)
+        return self._timestamp
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典（仅在有执行智能体时包含agent）"""
+        output = self.output
+        if type(output) is dict and output.get("output_type") == "default" and "timestamp" not in output:
+            # 默认输出执行时只记录纳秒时间戳，对外输出时才格式化为ISO字符串
+            output["timestamp"] = format_timestamp_ns(output["timestamp_ns"])
+        data = {
+            "step_id": self.step_id,
+            "name": self.name,
+            "status": self.status,
+            "output": self.output,
+            "error": self.error,
+            "timestamp_ns": self.timestamp_ns,
+            "duration_ns": self.duration_ns
+        }
+        if self.agent is not None:
+            data["agent"] = self.agent
+        return data
+
+
+@dataclass(slots=True)
 class SOPResult:
     """SOP执行结果"""
     success: bool
     task: str
     steps_executed: List[Dict[str, Any]]
-    final_output: Any
+    final_output: Any = None
     errors: List[str] = field(default_factory=list)
     execution_time: float = 0.0
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
+@dataclass(frozen=True, slots=True)
+class CompiledPlan:
+    """预处理的SOP执行计划（不可变，可跨执行共享）"""
+    steps: Tuple[SOPStep, ...]
+    deps_count: Tuple[int, ...]                      # 各步骤的依赖数（不存在的依赖同样计入，永不就绪）
+    dependents: Tuple[Tuple[int, ...], ...]          # 各步骤的下游步骤下标
+    dep_masks: Tuple[int, ...]                       # 各步骤依赖步骤下标的位掩码
+    order: Tuple[int, ...]                           # 拓扑顺序（依赖缺失或成环的步骤不在其中）
+    role_to_step_indices: Dict[AgentRole, Tuple[int, ...]]
+    has_async_execute: Tuple[bool, ...] = ()         # 各步骤是否有自定义执行函数
+    assigned_agent_name: Tuple[Optional[str], ...] = ()  # 引擎绑定的各步骤智能体（未绑定时为空）
+    
+    @classmethod
+    def from_steps(cls, steps: List[SOPStep]) -> "CompiledPlan":
+        """由步骤列表构建执行计划"""
+        steps = tuple(steps)
+        producers: Dict[str, List[int]] = {}
+        role_to_step_indices: Dict[AgentRole, List[int]] = {}
+        for index, step in enumerate(steps):
+            producers.setdefault(step.step_id, []).append(index)
+            role_to_step_indices.setdefault(step.assigned_role, []).append(index)
+        
+        deps_count = [0] * len(steps)
+        dependents: List[List[int]] = [[] for _ in steps]
+        dep_masks = [0] * len(steps)
+        for index, step in enumerate(steps):
+            for dep in dict.fromkeys(step.dependencies):
+                for producer in producers.get(dep, (None,)):
+                    deps_count[index] += 1
+                    if producer is not None:
+                        dependents[producer].append(index)
+                        dep_masks[index] |= 1 << producer
+        
+        # Kahn算法求拓扑顺序
+        remaining = list(deps_count)
+        order = [index for index in range(len(steps)) if remaining[index] == 0]
+        for index in order:
+            for dependent in dependents[index]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    order.append(dependent)
+        
+        return cls(
+            steps=steps,
+            deps_count=tuple(deps_count),
+            dependents=tuple(tuple(indices) for indices in dependents),
+            dep_masks=tuple(dep_masks),
+            order=tuple(order),
+            has_async_execute=tuple(step.async_execute is not None for step in steps),
+            role_to_step_indices={
+                role: tuple(indices) for role, indices in role_to_step_indices.items()
+            }
+        )
+
+
 class StrategyScientistGroup:
     """谋略科学家组 - 核心智能体团队"""
     
     def __init__(self):
         self._agents: Dict[str, Agent] = {}
+        # 角色索引，按加入顺序保存各角色的智能体
+        self._by_role: Dict[AgentRole, List[Agent]] = defaultdict(list)
+        # 团队版本号，每次添加智能体时递增，供引擎判断派生数据是否失效
+        self._version: int = 0
         self._initialize_team()
     
     def _initialize_team(self):
@@ -73,7 +272,7 @@ class StrategyScientistGroup:
             description="顶尖谋略家，擅长制定整体战略规划",
             capabilities=["战略分析", "局势研判", "策略制定", "目标规划"]
         )
-        self._agents["贾诩"] = jiaxu
+        self.add_agent(jiaxu)
         
         # 庞统 - 方案推演
         pangtong = Agent(
@@ -83,7 +282,7 @@ class StrategyScientistGroup:
             description="杰出的方案推演专家，精通各种方案的可行性分析",
             capabilities=["方案推演", "可行性分析", "情景模拟", "效果评估"]
         )
-        self._agents["庞统"] = pangtong
+        self.add_agent(pangtong)
         
         # 蒋济 - 风险评估
         jiangji = Agent(
@@ -93,7 +292,7 @@ class StrategyScientistGroup:
             description="严谨的风险评估专家，善于识别潜在风险",
             capabilities=["风险识别", "风险量化", "风险应对", "安全评估"]
         )
-        self._agents["蒋济"] = jiangji
+        self.add_agent(jiangji)
     
     def get_agent(self, name: str) -> Optional[Agent]:
         """获取智能体"""
@@ -101,7 +300,7 @@ class StrategyScientistGroup:
     
     def get_agents_by_role(self, role: AgentRole) -> List[Agent]:
         """根据角色获取智能体"""
-        return [agent for agent in self._agents.values() if agent.role == role]
+        return list(self._by_role.get(role, ()))
     
     def list_agents(self) -> List[Agent]:
         """列出所有智能体"""
@@ -109,7 +308,13 @@ class StrategyScientistGroup:
     
     def add_agent(self, agent: Agent):
         """添加智能体"""
+        previous = self._agents.get(agent.name)
+        if previous is not None:
+            # 同名智能体被替换，从角色索引中移除旧实例
+            self._by_role[previous.role].remove(previous)
         self._agents[agent.name] = agent
+        self._by_role[agent.role].append(agent)
+        self._version += 1
 
 
 class SOPTemplate:
@@ -211,6 +416,26 @@ class SOPTemplate:
         ]
     }
     
+    # 各模板的执行计划，模块导入时构建
+    _COMPILED: Dict[str, CompiledPlan] = {}
+    
+    @classmethod
+    def _compile(cls) -> Dict[str, CompiledPlan]:
+        """预处理所有模板的执行计划"""
+        return {name: CompiledPlan.from_steps(steps) for name, steps in cls.TEMPLATES.items()}
+    
+    @classmethod
+    def get_plan(cls, template_name: str) -> CompiledPlan:
+        """获取模板的执行计划（共享实例，无需复制；导入后新增的模板在首次使用时编译）"""
+        if template_name not in cls.TEMPLATES:
+            template_name = "default"
+        plan = cls._COMPILED.get(template_name)
+        if plan is None:
+            plan = cls._COMPILED.setdefault(
+                template_name, CompiledPlan.from_steps(cls.TEMPLATES[template_name])
+            )
+        return plan
+    
     @classmethod
     def get_template(cls, template_name: str) -> List[SOPStep]:
         """获取SOP模板"""
@@ -222,6 +447,9 @@ class SOPTemplate:
         return list(cls.TEMPLATES.keys())
 
 
+SOPTemplate._COMPILED = SOPTemplate._compile()
+
+
 class SOPEngine:
     """
     MetaGPT SOP引擎 - 标准化流程执行引擎
@@ -231,8 +459,18 @@ class SOPEngine:
     - 执行标准化流程
     - 管理智能体团队
     - 自定义SOP模板
+    - 批量执行同一模板的多个任务
     """
     
+    SOP_CACHE_SIZE = 128  # 流程结果缓存条数
+    STEP_CACHE_SIZE = 512  # 步骤输出缓存条数
+    # 已完成步骤名称 -> 建议（按定义顺序输出）
+    RECO_MAP: Dict[str, str] = {
+        "策略设计": "建议后续进行方案推演以验证策略可行性",
+        "方案推演": "建议进行风险评估以确保方案安全",
+        "风险评估": "所有关键步骤已完成，建议进入实施阶段"
+    }
+    
     def __init__(self, team: Optional[StrategyScientistGroup] = None):
         """
         初始化SOP引擎
@@ -243,7 +481,13 @@ class SOPEngine:
         self.team = team or StrategyScientistGroup()
         self.custom_roles: Dict[str, AgentRole] = {}
         self.execution_history: List[SOPResult] = []
-        self._step_outputs: Dict[str, Any] = {}
+        # 流程结果LRU缓存（相同任务、模板、团队与步骤直接复用）
+        self._sop_cache: "OrderedDict[str, SOPResult]" = OrderedDict()
+        # 步骤输出LRU缓存：(步骤ID, 智能体, 输入哈希) -> (执行函数, 输出)
+        self._step_cache: "OrderedDict[Tuple[str, str, str], Tuple[Optional[Callable], Any]]" = OrderedDict()
+        # 已绑定智能体的模板执行计划，团队版本变化时重新编译
+        self._plans: Dict[str, CompiledPlan] = {}
+        self._plans_version = -1
         
     async def define_role(self, name: str, specialty: str, 
                          description: str = "", 
@@ -260,16 +504,10 @@ class SOPEngine:
         Returns:
             Agent: 创建的智能体
         """
-        role = AgentRole.GENERAL
-        
-        # 根据专业领域自动分配角色
-        specialty_lower = specialty.lower()
-        if "策略" in specialty or "战略" in specialty:
-            role = AgentRole.STRATEGY_DESIGN
-        elif "推演" in specialty or "方案" in specialty or "评估" in specialty:
-            role = AgentRole.PLAN_EVALUATION
-        elif "风险" in specialty:
-            role = AgentRole.RISK_ASSESSMENT
+        # 根据专业领域自动分配角色（一次正则扫描收集命中的关键词）
+        matched = {_TOKEN_TO_ROLE[token] for token in _ROLE_REGEX.findall(specialty)}
+        role = next((candidate for candidate in _ROLE_PRIORITY if candidate in matched),
+                    AgentRole.GENERAL)
         
         agent = Agent(
             name=name,
@@ -288,7 +526,8 @@ class SOPEngine:
                          team: Optional[List[Agent]] = None,
                          template: str = "default",
                          custom_steps: Optional[List[SOPStep]] = None,
-                         step_callbacks: Optional[Dict[str, Callable]] = None) -> SOPResult:
+                         step_callbacks: Optional[Dict[str, Callable]] = None,
+                         use_cache: bool = True) -> SOPResult:
         """
         执行标准化流程
         
@@ -298,94 +537,299 @@ class SOPEngine:
             template: SOP模板名称
             custom_steps: 自定义步骤列表
             step_callbacks: 步骤回调函数字典
+            use_cache: 是否使用流程结果缓存与步骤输出缓存（含回调或自定义执行函数时不缓存流程结果）
             
         Returns:
             SOPResult: 执行结果
         """
-        import time
-        start_time = time.time()
+        start_ns = time.monotonic_ns()
         
-        steps_executed = []
-        errors = []
-        self._step_outputs = {}
+        errors: List[str] = []
+        # 步骤输出为本次执行的局部状态，同一引擎可安全并发执行多个流程
+        step_outputs: Dict[str, Any] = {}
         
-        # 获取执行步骤
+        # 获取执行计划（模板计划已预处理，自定义步骤按次构建）
         if custom_steps:
-            steps = custom_steps
+            plan = self._bind_plan(CompiledPlan.from_steps(custom_steps))
         else:
-            steps = SOPTemplate.get_template(template)
+            plan = self._get_plan(template)
+        steps = plan.steps
         
         # 使用提供的团队或默认团队
-        execution_team = {agent.name: agent for agent in (team or self.team.list_agents())}
-        
-        # 执行每个步骤
-        for step in steps:
-            step_result = {
-                "step_id": step.step_id,
-                "name": step.name,
-                "status": "pending",
-                "output": None,
-                "error": None
-            }
+        # 未指定团队时直接使用全局团队的名称索引（只读）
+        execution_team = self._execution_team(team)
+        
+        # 回调与自定义执行函数的输出依赖外部环境，不参与缓存
+        cache_key = None
+        if use_cache and not step_callbacks and not any(step.async_execute for step in steps):
+            cache_key = self._sop_cache_key(task, template, team, execution_team, steps)
+            cached = self._sop_cache.get(cache_key)
+            if cached is not None:
+                self._sop_cache.move_to_end(cache_key)
+                # 缓存的结果与返回给调用方的结果互不共享任何可变对象
+                result = self._copy_result(cached)
+                result.metadata["cached"] = True
+                self.execution_history.append(result)
+                return result
+        
+        # 未指定团队时使用计划中预绑定的智能体
+        team_by_role = self._team_by_role(execution_team) if team else None
+        callbacks = self._prepare_callbacks(step_callbacks)
+        
+        # 按依赖关系动态调度：依赖全部结束的步骤并发执行
+        executions = await self._schedule_steps(
+            plan, task, team_by_role, callbacks, step_outputs, errors, use_cache
+        )
+        
+        result = self._build_result(
+            task, template, plan, executions, errors, step_outputs,
+            (time.monotonic_ns() - start_ns) / 1e9, len(execution_team)
+        )
+        
+        if cache_key is not None:
+            self._sop_cache[cache_key] = self._copy_result(result)
+            if len(self._sop_cache) > self.SOP_CACHE_SIZE:
+                self._sop_cache.popitem(last=False)
+        
+        self.execution_history.append(result)
+        
+        return result
+    
+    async def execute_sop_batch(self, tasks: List[str],
+                               team: Optional[List[Agent]] = None,
+                               template: str = "default",
+                               step_callbacks: Optional[Dict[str, Callable]] = None,
+                               use_cache: bool = True) -> List[SOPResult]:
+        """
+        批量执行同一模板的多个任务
+        
+        按拓扑顺序逐个步骤推进，每个步骤在所有任务上一起执行后再进入下一步骤。
+        步骤的执行函数或回调提供 batch_execute(input_batch, agent) 时每步只调用一次，
+        否则各任务的该步骤并发执行。
+        
+        Args:
+            tasks: 执行的任务列表
+            team: 使用的智能体团队
+            template: SOP模板名称
+            step_callbacks: 步骤回调函数字典
+            use_cache: 是否使用步骤输出缓存
             
-            try:
-                # 检查依赖
-                if step.dependencies:
-                    unmet_deps = [dep for dep in step.dependencies 
-                                 if dep not in self._step_outputs]
-                    if unmet_deps:
-                        step_result["status"] = "skipped"
-                        step_result["error"] = f"未满足依赖: {unmet_deps}"
-                        errors.append(f"步骤 {step.step_id} 因依赖未满足而跳过")
-                        steps_executed.append(step_result)
-                        continue
-                
-                # 查找可用的智能体
-                agent = None
-                for team_agent in execution_team.values():
-                    if team_agent.role == step.assigned_role:
-                        agent = team_agent
-                        break
-                
-                if not agent:
-                    # 尝试从全局团队获取
-                    agents = self.team.get_agents_by_role(step.assigned_role)
-                    if agents:
-                        agent = agents[0]
-                
-                if not agent:
-                    step_result["status"] = "skipped"
-                    step_result["error"] = f"未找到角色为 {step.assigned_role.value} 的智能体"
-                    errors.append(f"步骤 {step.step_id} 因无合适智能体而跳过")
-                    steps_executed.append(step_result)
+        Returns:
+            List[SOPResult]: 与tasks顺序一致的执行结果
+        """
+        start_ns = time.monotonic_ns()
+        
+        plan = self._get_plan(template)
+        steps = plan.steps
+        execution_team = self._execution_team(team)
+        team_by_role = self._team_by_role(execution_team) if team else None
+        callbacks = self._prepare_callbacks(step_callbacks)
+        
+        # 各任务独立的步骤输出与执行记录
+        outputs: List[Dict[str, Any]] = [{} for _ in tasks]
+        executions: List[List[Optional[StepExecution]]] = [[None] * len(steps) for _ in tasks]
+        step_errors: List[List[Optional[str]]] = [[None] * len(steps) for _ in tasks]
+        # 各任务中失败的关键步骤ID，设置后该任务不再执行后续步骤
+        aborted_by: List[Optional[str]] = [None] * len(tasks)
+        
+        for index in plan.order:
+            step = steps[index]
+            pending = []
+            for task_index, step_outputs in enumerate(outputs):
+                if aborted_by[task_index] is not None:
+                    executions[task_index][index], step_errors[task_index][index] = \
+                        self._skip_for_abort(step, aborted_by[task_index], "skipped")
                     continue
-                
-                # 准备输入
-                input_data = self._prepare_input(step, task)
-                
-                # 执行步骤
-                output = await self._execute_step(step, input_data, agent, step_callbacks)
-                
-                # 保存输出
-                self._step_outputs[step.step_id] = output
-                step_result["output"] = output
-                step_result["status"] = "completed"
-                step_result["agent"] = agent.name
-                
-            except Exception as e:
-                step_result["status"] = "failed"
-                step_result["error"] = str(e)
-                errors.append(f"步骤 {step.step_id} 执行失败: {str(e)}")
+                unmet_deps = self._unmet_dependencies(step, step_outputs)
+                if unmet_deps:
+                    executions[task_index][index], step_errors[task_index][index] = \
+                        self._skip_for_deps(step, unmet_deps)
+                else:
+                    pending.append(task_index)
+            if not pending:
+                continue
+            
+            agent = self._resolve_agent(step, team_by_role, plan.assigned_agent_name[index])
+            if not agent:
+                for task_index in pending:
+                    executions[task_index][index], step_errors[task_index][index] = \
+                        self._skip_for_agent(step)
+                continue
+            
+            input_batch = [
+                self._prepare_input(step, tasks[task_index], outputs[task_index], agent)
+                for task_index in pending
+            ]
+            step_start_ns = time.monotonic_ns()
+            batch_outputs = await self._execute_step_batch(
+                step, input_batch, agent, callbacks, use_cache
+            )
+            duration_ns = time.monotonic_ns() - step_start_ns
+            finished_ns = time.time_ns()
             
-            steps_executed.append(step_result)
+            for task_index, output in zip(pending, batch_outputs):
+                if isinstance(output, BaseException) and not isinstance(output, Exception):
+                    raise output
+                execution = StepExecution(
+                    step_id=step.step_id, name=step.name,
+                    timestamp_ns=finished_ns, duration_ns=duration_ns
+                )
+                if isinstance(output, Exception):
+                    execution.status = "failed"
+                    execution.error = str(output)
+                    step_errors[task_index][index] = f"步骤 {step.step_id} 执行失败: {str(output)}"
+                    if step.critical:
+                        aborted_by[task_index] = step.step_id
+                else:
+                    execution.status = "completed"
+                    execution.output = output
+                    execution.agent = agent.name
+                    outputs[task_index][step.step_id] = output
+                executions[task_index][index] = execution
+        
+        execution_time = (time.monotonic_ns() - start_ns) / 1e9
+        results = []
+        for task_index, task in enumerate(tasks):
+            task_executions = executions[task_index]
+            # 依赖缺失或成环的步骤不在拓扑顺序中，按依赖未满足跳过
+            for index, step in enumerate(steps):
+                if task_executions[index] is None and aborted_by[task_index] is not None:
+                    task_executions[index], step_errors[task_index][index] = \
+                        self._skip_for_abort(step, aborted_by[task_index], "skipped")
+                elif task_executions[index] is None:
+                    unmet_deps = self._unmet_dependencies(step, outputs[task_index])
+                    task_executions[index], step_errors[task_index][index] = \
+                        self._skip_for_deps(step, unmet_deps)
+            errors = [error for error in step_errors[task_index] if error is not None]
+            result = self._build_result(
+                task, template, plan, task_executions, errors, outputs[task_index],
+                execution_time, len(execution_team)
+            )
+            self.execution_history.append(result)
+            results.append(result)
+        
+        return results
+    
+    async def _execute_step_batch(self, step: SOPStep, input_batch: List[Dict[str, Any]],
+                                  agent: Agent,
+                                  callbacks: Optional[_PreparedCallbacks],
+                                  use_cache: bool = True) -> List[Any]:
+        """在一批输入上执行同一步骤，失败的任务对应位置为异常对象"""
+        executor = self._step_executor(step, callbacks)
+        batch_execute = getattr(executor, "batch_execute", None)
+        
+        if executor is None:
+            return [self._run_default_output(step, input_data, agent) for input_data in input_batch]
+        
+        if batch_execute is None:
+            return await asyncio.gather(
+                *(self._execute_step(step, input_data, agent, callbacks, use_cache)
+                  for input_data in input_batch),
+                return_exceptions=True
+            )
+        
+        try:
+            batch_outputs = batch_execute(input_batch, agent)
+            if inspect.isawaitable(batch_outputs):
+                batch_outputs = await batch_outputs
+            batch_outputs = list(batch_outputs)
+            if len(batch_outputs) != len(input_batch):
+                raise ValueError(
+                    f"batch_execute返回 {len(batch_outputs)} 个结果，应为 {len(input_batch)} 个"
+                )
+        except Exception as e:
+            return [e] * len(input_batch)
+        return batch_outputs
+    
+    def _prepare_callbacks(self, step_callbacks: Optional[Dict[str, Callable]]
+                           ) -> Optional[_PreparedCallbacks]:
+        """每次执行只判定一次回调是否为协程函数"""
+        if not step_callbacks:
+            return None
+        return {
+            step_id: (callback, asyncio.iscoroutinefunction(callback))
+            for step_id, callback in step_callbacks.items()
+        }
+    
+    def _step_executor(self, step: SOPStep,
+                       callbacks: Optional[_PreparedCallbacks]) -> Optional[Callable]:
+        """获取步骤的自定义执行函数或回调"""
+        if step.async_execute:
+            return step.async_execute
+        entry = callbacks.get(step.step_id) if callbacks else None
+        return entry[0] if entry else None
+    
+    def _execution_team(self, team: Optional[List[Agent]]) -> Dict[str, Agent]:
+        """获取执行团队的名称索引，未指定团队时返回全局团队索引本身（调用方不得修改）"""
+        if not team:
+            return self.team._agents
+        return {agent.name: agent for agent in team}
+    
+    def _team_by_role(self, execution_team: Dict[str, Agent]) -> Dict[AgentRole, Agent]:
+        """每个角色取团队中最先出现的智能体"""
+        team_by_role: Dict[AgentRole, Agent] = {}
+        for agent in execution_team.values():
+            team_by_role.setdefault(agent.role, agent)
+        return team_by_role
+    
+    def _resolve_agent(self, step: SOPStep, team_by_role: Optional[Dict[AgentRole, Agent]],
+                       assigned_name: Optional[str] = None) -> Optional[Agent]:
+        """
+        查找可用的智能体，未找到时尝试从全局团队获取
+        
+        team_by_role为None表示使用全局团队，此时优先取计划预绑定的智能体；
+        绑定后团队被直接修改时按角色校验，失效则回退为按角色查找。
+        """
+        if team_by_role is None:
+            agent = self.team._agents.get(assigned_name) if assigned_name else None
+            if agent is not None and agent.role == step.assigned_role:
+                return agent
+            team_by_role = {}
+        return team_by_role.get(step.assigned_role) or next(
+            iter(self.team._by_role.get(step.assigned_role, ())), None
+        )
+    
+    def _get_plan(self, template: str) -> CompiledPlan:
+        """获取绑定了全局团队智能体的模板执行计划"""
+        if template not in SOPTemplate.TEMPLATES:
+            template = "default"
+        if self._plans_version != self.team._version:
+            self._recompile_plans()
+        plan = self._plans.get(template)
+        if plan is None:
+            plan = self._plans[template] = self._bind_plan(SOPTemplate.get_plan(template))
+        return plan
+    
+    def _bind_plan(self, plan: CompiledPlan) -> CompiledPlan:
+        """为计划中的每个步骤预选全局团队中对应角色的首个智能体"""
+        assigned = []
+        for step in plan.steps:
+            agents = self.team._by_role.get(step.assigned_role)
+            assigned.append(agents[0].name if agents else None)
+        return replace(plan, assigned_agent_name=tuple(assigned))
+    
+    def _recompile_plans(self):
+        """团队变化后丢弃已绑定的计划，下次执行时重新编译"""
+        self._plans.clear()
+        self._plans_version = self.team._version
+    
+    def _build_result(self, task: str, template: str, plan: CompiledPlan,
+                      executions: List[StepExecution], errors: List[str],
+                      step_outputs: Dict[str, Any], execution_time: float,
+                      team_size: int) -> SOPResult:
+        """由步骤执行记录构建执行结果"""
+        steps = plan.steps
         
-        execution_time = time.time() - start_time
+        # 对外结果保持字典形式
+        steps_executed = [execution.to_dict() for execution in executions]
+        completed = [execution for execution in executions if execution.status == "completed"]
         
-        # 生成最终输出
-        final_output = self._generate_final_output(steps, steps_executed)
+        # 最终输出（含建议），时间戳取执行结束时刻
+        final_output = self._generate_final_output(
+            steps, executions, steps_executed, step_outputs, time.time_ns()
+        )
         
-        # 构建结果
-        result = SOPResult(
+        return SOPResult(
             success=len(errors) == 0,
             task=task,
             steps_executed=steps_executed,
@@ -395,87 +839,420 @@ class SOPEngine:
             metadata={
                 "template": template,
                 "steps_count": len(steps),
-                "completed_steps": len([s for s in steps_executed if s["status"] == "completed"]),
-                "team_size": len(execution_team)
+                "completed_steps": len(completed),
+                "team_size": team_size
             }
         )
+    
+    @staticmethod
+    def _copy_result(result: SOPResult) -> SOPResult:
+        """深拷贝执行结果（步骤记录与最终输出共用memo，保持两者间的共享引用）"""
+        memo: Dict[int, Any] = {}
+        return SOPResult(
+            success=result.success,
+            task=result.task,
+            steps_executed=_deepcopy_plain(result.steps_executed, memo),
+            final_output=_deepcopy_plain(result.final_output, memo),
+            errors=list(result.errors),
+            execution_time=result.execution_time,
+            metadata=_deepcopy_plain(result.metadata, memo)
+        )
+    
+    def _sop_cache_key(self, task: str, template: str, team: Optional[List[Agent]],
+                       execution_team: Dict[str, Agent], steps: Tuple[SOPStep, ...]) -> str:
+        """计算流程结果缓存键（任务、模板、团队签名与步骤指纹）"""
+        if team:
+            team_signature = self._signature(execution_team.values())
+            # 指定团队缺少角色时会回退到全局团队，全局团队同样计入签名
+            team_signature.append(self._signature(self.team._agents.values()))
+        else:
+            team_signature = self._signature(self.team._agents.values())
+        steps_fingerprint = [
+            (step.step_id, step.name, step.description, step.assigned_role.value,
+             step.dependencies, step.input_template, step.output_template)
+            for step in steps
+        ]
+        raw = f"{template}|{task}|{team_signature}|{steps_fingerprint}"
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+    
+    @staticmethod
+    def _signature(agents) -> List[Tuple[str, str, str, str, Tuple[str, ...]]]:
+        """
+        计算团队签名（按名称、角色、专业领域、描述、能力排序）
         
-        self.execution_history.append(result)
+        描述与能力会写入步骤输入，同样计入签名；每次按当前内容计算，
+        智能体被直接修改时不会命中过期结果。
+        """
+        return sorted(
+            (agent.name, agent.role.value, agent.specialty, agent.description,
+             tuple(agent.capabilities))
+            for agent in agents
+        )
+    
+    async def _schedule_steps(self, plan: CompiledPlan, task: str,
+                              team_by_role: Optional[Dict[AgentRole, Agent]],
+                              callbacks: Optional[_PreparedCallbacks],
+                              step_outputs: Dict[str, Any],
+                              errors: List[str],
+                              use_cache: bool = True) -> List[StepExecution]:
+        """拓扑调度执行步骤，结果与错误按步骤定义顺序返回，完成步骤的输出写入step_outputs"""
+        steps = plan.steps
+        count = len(steps)
+        # 剩余未结束的依赖数（按下标跟踪）
+        remaining_deps = list(plan.deps_count)
+        dependents = plan.dependents
+        dep_masks = plan.dep_masks
+        # 已完成步骤下标的位掩码，依赖检查只需一次整数与运算
+        completed_mask = 0
         
-        return result
+        step_results: List[Optional[StepExecution]] = [None] * count
+        step_errors: List[Optional[str]] = [None] * count
+        ready = [index for index in range(count) if remaining_deps[index] == 0]
+        running: Dict[asyncio.Task, int] = {}
+        # 失败的关键步骤ID，设置后不再调度新步骤
+        aborted_by: Optional[str] = None
+        
+        try:
+            while ready or running:
+                for index in ready:
+                    if aborted_by is not None:
+                        # 内联执行的关键步骤已失败，其余就绪步骤留待统一跳过
+                        break
+                    step = steps[index]
+                    # 依赖均已完成时走快速路径，否则才构建未满足依赖列表
+                    unmet_deps = None
+                    if completed_mask & dep_masks[index] != dep_masks[index]:
+                        unmet_deps = self._unmet_dependencies(step, step_outputs)
+                    if unmet_deps:
+                        # 依赖失败或被跳过，直接结束，继续向下游传递
+                        settled = self._skip_for_deps(step, unmet_deps)
+                    else:
+                        agent = self._resolve_agent(
+                            step, team_by_role, plan.assigned_agent_name[index]
+                        )
+                        if agent is None:
+                            settled = self._skip_for_agent(step)
+                        else:
+                            # 输入在调度协程中准备，执行期间不读取共享输出
+                            input_data = self._prepare_input(step, task, step_outputs, agent)
+                            if plan.has_async_execute[index] or (callbacks and step.step_id in callbacks):
+                                worker = asyncio.ensure_future(
+                                    self._run_step(step, input_data, agent, callbacks, use_cache)
+                                )
+                                running[worker] = index
+                                continue
+                            # 默认执行逻辑为同步且开销很小，直接在调度协程中完成
+                            step_result, step_error, output = self._run_default_step(
+                                step, input_data, agent
+                            )
+                            settled = (step_result, step_error)
+                            if step_result.status == "completed":
+                                step_outputs[step.step_id] = output
+                                completed_mask |= 1 << index
+                            elif step.critical:
+                                aborted_by = step.step_id
+                    step_results[index], step_errors[index] = settled
+                    for dependent in dependents[index]:
+                        remaining_deps[dependent] -= 1
+                        if remaining_deps[dependent] == 0:
+                            ready.append(dependent)
+                ready = []
+                if not running:
+                    break
+                
+                if aborted_by is None:
+                    done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    done = ()
+                for worker in done:
+                    index = running.pop(worker)
+                    step_result, step_error, output = worker.result()
+                    step_results[index] = step_result
+                    step_errors[index] = step_error
+                    # 输出仅由调度协程写入，无需加锁
+                    if step_result.status == "completed":
+                        step_outputs[steps[index].step_id] = output
+                        completed_mask |= 1 << index
+                    elif step_result.status == "failed" and steps[index].critical:
+                        aborted_by = steps[index].step_id
+                    for dependent in dependents[index]:
+                        remaining_deps[dependent] -= 1
+                        if remaining_deps[dependent] == 0:
+                            ready.append(dependent)
+                
+                if aborted_by is not None:
+                    # 关键步骤失败：取消并等待其余正在执行的步骤结束，不再调度新步骤
+                    pending = list(running.items())
+                    for worker, _ in pending:
+                        worker.cancel()
+                    outcomes = await asyncio.gather(*running, return_exceptions=True)
+                    running.clear()
+                    for (_, index), outcome in zip(pending, outcomes):
+                        if isinstance(outcome, tuple):
+                            # 取消前已执行结束的步骤保留其结果
+                            step_results[index], step_errors[index], output = outcome
+                            if step_results[index].status == "completed":
+                                step_outputs[steps[index].step_id] = output
+                        else:
+                            step_results[index], step_errors[index] = self._skip_for_abort(
+                                steps[index], aborted_by, "cancelled"
+                            )
+                    break
+        finally:
+            # 外部取消时一并取消仍在执行的步骤
+            for worker in running:
+                worker.cancel()
+        
+        # 流程终止后未开始的步骤，以及依赖缺失或存在环而始终未就绪的步骤
+        for index, step in enumerate(steps):
+            if step_results[index] is None:
+                if aborted_by is not None:
+                    step_results[index], step_errors[index] = self._skip_for_abort(
+                        step, aborted_by, "skipped"
+                    )
+                else:
+                    step_results[index], step_errors[index] = self._skip_for_deps(
+                        step, self._unmet_dependencies(step, step_outputs)
+                    )
+        
+        errors.extend(error for error in step_errors if error is not None)
+        return step_results
+    
+    @staticmethod
+    def _unmet_dependencies(step: SOPStep, step_outputs: Dict[str, Any]) -> List[str]:
+        """获取尚无输出的依赖步骤"""
+        return [dep for dep in step.dependencies if dep not in step_outputs]
+    
+    def _skip_for_deps(self, step: SOPStep, unmet_deps: List[str]) -> Tuple[StepExecution, str]:
+        """构建因依赖未满足而跳过的步骤结果"""
+        step_result = StepExecution(
+            step_id=step.step_id,
+            name=step.name,
+            status="skipped",
+            error=f"未满足依赖: {unmet_deps}",
+            timestamp_ns=time.time_ns()
+        )
+        return step_result, f"步骤 {step.step_id} 因依赖未满足而跳过"
+    
+    def _skip_for_abort(self, step: SOPStep, aborted_by: str,
+                        status: str) -> Tuple[StepExecution, str]:
+        """构建因关键步骤失败而取消（cancelled）或跳过（skipped）的步骤结果"""
+        step_result = StepExecution(
+            step_id=step.step_id,
+            name=step.name,
+            status=status,
+            error=f"关键步骤 {aborted_by} 执行失败，流程已终止",
+            timestamp_ns=time.time_ns()
+        )
+        action = "取消" if status == "cancelled" else "跳过"
+        return step_result, f"步骤 {step.step_id} 因关键步骤 {aborted_by} 失败而{action}"
+    
+    def _skip_for_agent(self, step: SOPStep) -> Tuple[StepExecution, str]:
+        """构建因无合适智能体而跳过的步骤结果"""
+        step_result = StepExecution(
+            step_id=step.step_id,
+            name=step.name,
+            status="skipped",
+            error=f"未找到角色为 {step.assigned_role.value} 的智能体",
+            timestamp_ns=time.time_ns()
+        )
+        return step_result, f"步骤 {step.step_id} 因无合适智能体而跳过"
+    
+    def _run_default_step(self, step: SOPStep, input_data: Dict[str, Any],
+                          agent: Agent) -> Tuple[StepExecution, Optional[str], Any]:
+        """以默认执行逻辑完成步骤，返回步骤结果、错误信息及输出"""
+        start_ns = time.monotonic_ns()
+        output = self._run_default_output(step, input_data, agent)
+        step_result = StepExecution(
+            step_id=step.step_id,
+            name=step.name,
+            duration_ns=time.monotonic_ns() - start_ns,
+            timestamp_ns=time.time_ns()
+        )
+        if isinstance(output, Exception):
+            step_result.status = "failed"
+            step_result.error = str(output)
+            return step_result, f"步骤 {step.step_id} 执行失败: {str(output)}", None
+        step_result.status = "completed"
+        step_result.output = output
+        step_result.agent = agent.name
+        return step_result, None, output
+    
+    def _run_default_output(self, step: SOPStep, input_data: Dict[str, Any], agent: Agent) -> Any:
+        """执行默认逻辑，失败时返回异常对象"""
+        try:
+            return self._default_output(step, input_data, agent)
+        except Exception as e:
+            return e
+    
+    async def _run_step(self, step: SOPStep, input_data: Dict[str, Any],
+                        agent: Agent,
+                        callbacks: Optional[_PreparedCallbacks],
+                        use_cache: bool = True
+                        ) -> Tuple[StepExecution, Optional[str], Any]:
+        """执行单个步骤，返回步骤结果、错误信息及输出"""
+        step_result = StepExecution(step_id=step.step_id, name=step.name)
+        start_ns = time.monotonic_ns()
+        
+        try:
+            # 执行步骤
+            output = await self._execute_step(step, input_data, agent, callbacks, use_cache)
+            
+            step_result.output = output
+            step_result.status = "completed"
+            step_result.agent = agent.name
+            return step_result, None, output
+            
+        except Exception as e:
+            step_result.status = "failed"
+            step_result.error = str(e)
+            return step_result, f"步骤 {step.step_id} 执行失败: {str(e)}", None
+        
+        finally:
+            step_result.duration_ns = time.monotonic_ns() - start_ns
+            step_result.timestamp_ns = time.time_ns()
     
-    def _prepare_input(self, step: SOPStep, task: str) -> Dict[str, Any]:
-        """准备步骤输入"""
-        # 填充输入模板
-        input_data = {"task": task}
+    def _prepare_input(self, step: SOPStep, task: str,
+                       step_outputs: Dict[str, Any],
+                       agent: Optional[Agent] = None) -> Dict[str, Any]:
+        """
+        准备步骤输入（step_outputs为本次执行已完成步骤的输出）
         
-        # 添加依赖步骤的输出
+        字段按稳定程度排列：步骤与智能体信息在前，依赖输出居中，任务在最后，
+        使回调直接序列化输入构造提示词时能共享提示词缓存前缀。
+        """
+        input_data: Dict[str, Any] = {"step_id": step.step_id}
+        if agent is not None:
+            input_data["role_description"] = agent.description
+            input_data["capabilities"] = agent.capabilities
+        
+        # 添加依赖步骤的输出（按依赖声明顺序）
         for dep in step.dependencies:
-            if dep in self._step_outputs:
-                input_data[f"step_{dep}_output"] = self._step_outputs[dep]
+            if dep in step_outputs:
+                input_data[f"step_{dep}_output"] = step_outputs[dep]
+        
+        # 填充任务
+        input_data["task"] = task
         
         return input_data
     
     async def _execute_step(self, step: SOPStep, input_data: Dict[str, Any],
                            agent: Agent, 
-                           callbacks: Optional[Dict[str, Callable]]) -> Dict[str, Any]:
-        """执行单个SOP步骤"""
+                           callbacks: Optional[_PreparedCallbacks],
+                           use_cache: bool = True) -> Dict[str, Any]:
+        """执行单个SOP步骤（声明可缓存的执行函数复用相同输入的已缓存输出）"""
+        executor = self._step_executor(step, callbacks)
+        key = None
+        if use_cache and executor is not None and (
+                step.cacheable or getattr(executor, "cacheable", False)):
+            key = self._step_cache_key(step, input_data, agent)
+        if key is None:
+            return await self._invoke_step(step, input_data, agent, callbacks)
+        
+        output = self._step_cache_get(key, executor)
+        if output is _MISSING:
+            output = await self._invoke_step(step, input_data, agent, callbacks)
+            self._step_cache_put(key, executor, output)
+        return output
+    
+    @staticmethod
+    def _step_cache_key(step: SOPStep, input_data: Dict[str, Any],
+                        agent: Agent) -> Optional[Tuple[str, str, str]]:
+        """步骤输出缓存键：(步骤ID, 智能体, 输入哈希)，输入无法序列化时返回None（不使用缓存）"""
+        try:
+            serialized = json.dumps(input_data, sort_keys=True, ensure_ascii=False, default=str)
+        except (TypeError, ValueError, RecursionError):
+            return None
+        input_hash = hashlib.blake2b(serialized.encode("utf-8"), digest_size=16).hexdigest()
+        return step.step_id, agent.name, input_hash
+    
+    def _step_cache_get(self, key: Tuple[str, str, str], executor: Optional[Callable]) -> Any:
+        """读取步骤输出缓存，未命中返回_MISSING"""
+        cached = self._step_cache.get(key)
+        # 仅当执行函数为同一对象时命中，避免替换回调后复用旧输出
+        if cached is not None and cached[0] is executor:
+            try:
+                output = copy.deepcopy(cached[1])
+            except Exception:
+                del self._step_cache[key]
+                return _MISSING
+            self._step_cache.move_to_end(key)
+            return output
+        return _MISSING
+    
+    def _step_cache_put(self, key: Tuple[str, str, str], executor: Optional[Callable], output: Any):
+        """写入步骤输出缓存，输出无法复制时不缓存"""
+        try:
+            snapshot = copy.deepcopy(output)
+        except Exception:
+            return
+        self._step_cache[key] = (executor, snapshot)
+        self._step_cache.move_to_end(key)
+        if len(self._step_cache) > self.STEP_CACHE_SIZE:
+            self._step_cache.popitem(last=False)
+    
+    async def _invoke_step(self, step: SOPStep, input_data: Dict[str, Any],
+                           agent: Agent,
+                           callbacks: Optional[_PreparedCallbacks]) -> Dict[str, Any]:
+        """调用步骤的执行函数、回调或默认执行逻辑"""
         
         # 如果有自定义执行函数，调用它
         if step.async_execute:
             return await step.async_execute(input_data, agent)
         
-        # 如果有回调函数，调用它
+        # 如果有回调函数，调用它（是否为协程函数已在执行开始时判定）
         if callbacks and step.step_id in callbacks:
-            callback = callbacks[step.step_id]
-            if asyncio.iscoroutinefunction(callback):
+            callback, is_coroutine = callbacks[step.step_id]
+            if is_coroutine:
                 return await callback(input_data, agent)
             else:
                 return callback(input_data, agent)
         
-        # 默认执行逻辑 - 返回步骤信息
+        return self._default_output(step, input_data, agent)
+    
+    @staticmethod
+    def _default_output(step: SOPStep, input_data: Dict[str, Any], agent: Agent) -> Dict[str, Any]:
+        """默认执行逻辑 - 返回步骤信息"""
         return {
             "step_id": step.step_id,
             "step_name": step.name,
             "agent_name": agent.name,
             "agent_role": agent.role.value,
             "input": input_data,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp_ns": time.time_ns(),
             "output_type": "default",
-            "content": f"由 {agent.name} ({agent.specialty}) 执行的 {step.name} 步骤"
+            "content": _format_default_content(agent.name, agent.specialty, step.name)
         }
     
-    def _generate_final_output(self, steps: List[SOPStep], 
-                               executed: List[Dict]) -> Dict[str, Any]:
-        """生成最终输出"""
-        completed_steps = [s for s in executed if s["status"] == "completed"]
+    def _generate_final_output(self, steps: Tuple[SOPStep, ...],
+                               executions: List[StepExecution],
+                               executed: List[Dict],
+                               step_outputs: Dict[str, Any],
+                               finished_ns: int) -> Dict[str, Any]:
+        """生成最终输出（executed为executions对应的字典形式）"""
+        completed = [
+            (execution, step_dict) for execution, step_dict in zip(executions, executed)
+            if execution.status == "completed"
+        ]
         
         return {
-            "success": len(completed_steps) == len(steps),
-            "completed_steps": len(completed_steps),
+            "success": len(completed) == len(steps),
+            "completed_steps": len(completed),
             "total_steps": len(steps),
             "execution_summary": {
-                "step_outputs": self._step_outputs,
-                "step_results": completed_steps
+                "step_outputs": step_outputs,
+                "step_results": [step_dict for _, step_dict in completed]
             },
-            "recommendations": self._generate_recommendations(completed_steps),
-            "timestamp": datetime.now().isoformat()
+            "recommendations": self._generate_recommendations(
+                [execution for execution, _ in completed]
+            ),
+            "timestamp": format_timestamp_ns(finished_ns)
         }
     
-    def _generate_recommendations(self, completed_steps: List[Dict]) -> List[str]:
+    def _generate_recommendations(self, completed_steps: List[StepExecution]) -> List[str]:
         """生成建议"""
-        recommendations = []
-        
-        step_names = [s["name"] for s in completed_steps if s["status"] == "completed"]
-        
-        if "策略设计" in step_names:
-            recommendations.append("建议后续进行方案推演以验证策略可行性")
-        if "方案推演" in step_names:
-            recommendations.append("建议进行风险评估以确保方案安全")
-        if "风险评估" in step_names:
-            recommendations.append("所有关键步骤已完成，建议进入实施阶段")
-        
-        return recommendations
+        step_names = {s.name for s in completed_steps if s.status == "completed"}
+        return [message for name, message in self.RECO_MAP.items() if name in step_names]
     
     def get_execution_history(self) -> List[SOPResult]:
         """获取执行历史"""
@@ -484,7 +1261,8 @@ class SOPEngine:
     def clear_history(self):
         """清空执行历史"""
         self.execution_history.clear()
-        self._step_outputs.clear()
+        self._sop_cache.clear()
+        self._step_cache.clear()
 
 
 # 便捷函数